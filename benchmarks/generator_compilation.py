@@ -0,0 +1,78 @@
+import argparse
+import os
+import time
+
+import torch
+
+from config.modules_configs.spade_config import SpadeConfig, MODELS
+from spade.networks.compilation import compile_network, COMPILE_MODES
+from spade.networks.generator import SPADEGenerator
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser(description='SPADE generator eager vs compiled latency micro-benchmark (CPU)')
+
+    parser.add_argument('--model', type=str, default='debug_small', choices=list(MODELS.keys()))
+    parser.add_argument('--width', type=int, default=0, help='Content width (model resolution by default)')
+    parser.add_argument('--modes', type=str, nargs='*', default=COMPILE_MODES, choices=COMPILE_MODES)
+    parser.add_argument('--threads', type=int, default=0, help='Torch CPU threads (torch default by default)')
+    parser.add_argument('--warm-up', type=int, default=2)
+    parser.add_argument('--repeats', type=int, default=5)
+
+    return parser.parse_args()
+
+
+def _build_generator(args) -> tuple[SPADEGenerator, SpadeConfig]:
+    config = SpadeConfig(model_name=args.model)
+
+    if args.width > 0:
+        config.content_resolution = (args.width, round(args.width / config.aspect_ratio))
+        config.crop_size = args.width
+
+    generator = SPADEGenerator(config)
+    # random weights give the same latency when checkpoints are not available
+    if os.path.exists(config.weights_path):
+        generator.load_state_dict(torch.load(config.weights_path, weights_only=True))
+
+    return generator.eval(), config
+
+
+if __name__ == "__main__":
+    args = _parse_arguments()
+
+    if args.threads > 0:
+        torch.set_num_threads(args.threads)
+
+    generator, config = _build_generator(args)
+    width, height = config.content_resolution
+
+    label_map = torch.randint(0, config.label_nc + 1, (1, 1, height, width))
+    input_semantics = torch.zeros(1, config.label_nc + 1, height, width).scatter_(1, label_map, 1.0)
+
+    print(f'{args.model} generator at {width}x{height}, {torch.get_num_threads()} threads')
+
+    reference_output = None
+    eager_time = None
+
+    for mode in args.modes:
+        start_time = time.perf_counter()
+        network = compile_network(generator, mode, input_semantics)
+
+        with torch.no_grad():
+            for _ in range(args.warm_up):
+                output = network(input_semantics)
+        warm_up_time = time.perf_counter() - start_time
+
+        with torch.no_grad():
+            start_time = time.perf_counter()
+            for _ in range(args.repeats):
+                output = network(input_semantics)
+        frame_time = (time.perf_counter() - start_time) / args.repeats * 1000
+
+        if reference_output is None:
+            reference_output = output
+        difference = (output - reference_output).abs().max().item()
+
+        eager_time = eager_time or frame_time
+        print(f'{mode:8} {frame_time:10.1f} ms/frame ({eager_time / frame_time:.2f}x), '
+              f'warm-up {warm_up_time:.1f}s, max difference {difference:.1e}')
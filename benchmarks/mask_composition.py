@@ -0,0 +1,95 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+
+from sequences_manager.mask_compositor import MaskCompositor
+from sequences_manager.packed_mask import pack_mask
+from sequences_manager.sequence_layer import SequenceLayer
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser(description='Mask composition micro-benchmark')
+
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=640)
+    parser.add_argument('--static-layers', type=int, default=3)
+    parser.add_argument('--dynamic-layers', type=int, default=5)
+    parser.add_argument('--columns', type=int, default=9)
+    parser.add_argument('--max-counter-value', type=int, default=30)
+    parser.add_argument('--repeats', type=int, default=50)
+
+    return parser.parse_args()
+
+
+def _build_layers(args, rng: np.random.Generator) -> list[SequenceLayer]:
+    layers = []
+    content_size = (args.width, args.height)
+    gray_shades = rng.choice(np.arange(1, 85), args.static_layers + args.dynamic_layers, replace=False)
+
+    for gray_shade in gray_shades[:args.static_layers]:
+        mask_image = np.zeros((args.height, args.width), dtype=np.uint8)
+        mask_image[rng.integers(0, args.height):] = gray_shade
+        layers.append(SequenceLayer.from_masks(int(gray_shade), content_size, static_mask_image=mask_image))
+
+    column_width = args.width // args.columns
+    for gray_shade in gray_shades[args.static_layers:]:
+        packed_dynamic_masks = {}
+
+        for column_index in range(args.columns):
+            frames = []
+            for counter in range(args.max_counter_value + 1):
+                frame = np.zeros((args.height, args.width), dtype=np.uint8)
+                center = (column_index * column_width + int(rng.integers(0, column_width)), int(rng.integers(0, args.height)))
+                cv2.circle(frame, center, counter * 4, 255, -1)
+                frames.append(pack_mask(frame))
+            packed_dynamic_masks[column_index] = np.stack(frames)
+
+        layers.append(SequenceLayer.from_masks(int(gray_shade), content_size, packed_dynamic_masks=packed_dynamic_masks))
+
+    return layers
+
+
+def _compose_with_where_chain(layers: list[SequenceLayer], counters: npt.NDArray[np.uint8], content_size: (int, int)):
+    # reference implementation: layers painted bottom-up, one np.where per layer
+    width, height = content_size
+    result = np.zeros((height, width), dtype=np.uint8)
+
+    for layer in reversed(layers):
+        layer_image = layer.build_layer_image(counters)
+        result = np.where(layer_image > 0, layer_image, result)
+
+    return result
+
+
+def _measure(function, states) -> float:
+    start_time = time.perf_counter()
+    for counters in states:
+        function(counters)
+    return (time.perf_counter() - start_time) / len(states) * 1000
+
+
+if __name__ == "__main__":
+    args = _parse_arguments()
+    rng = np.random.default_rng(0)
+    content_size = (args.width, args.height)
+
+    layers = _build_layers(args, rng)
+    compositor = MaskCompositor(layers, content_size)
+    output = np.empty((args.height, args.width), dtype=np.uint8)
+    region = (0, args.height, 0, args.width)
+
+    states = [rng.integers(0, args.max_counter_value + 1, args.columns) for _ in range(args.repeats)]
+
+    for counters in states:
+        compositor.compose(counters, region, output)
+        assert np.array_equal(output, _compose_with_where_chain(layers, counters, content_size)), 'composition mismatch'
+
+    where_chain_time = _measure(lambda counters: _compose_with_where_chain(layers, counters, content_size), states)
+    compositor_time = _measure(lambda counters: compositor.compose(counters, region, output), states)
+
+    print(f'{len(layers)} layers at {args.width}x{args.height}')
+    print(f'np.where chain:  {where_chain_time:8.3f} ms/frame')
+    print(f'MaskCompositor:  {compositor_time:8.3f} ms/frame ({where_chain_time / compositor_time:.2f}x)')
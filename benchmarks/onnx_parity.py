@@ -0,0 +1,101 @@
+import argparse
+import logging
+import time
+
+import numpy as np
+import torch
+
+from config.modules_configs.spade_config import SpadeConfig, MODELS
+from image_upscaler.image_upscaler import ImageUpscaler
+from image_upscaler.onnx_upscaler import OnnxUpscaler
+from spade.batched_inference import BatchedInferenceEngine
+from spade.onnx_backend import OnnxPix2PixModel, get_upscaler_onnx_path
+from spade.pix2pix_model import Pix2PixModel
+from spade.precision import build_reference_label_map, compute_psnr
+
+
+def _parse_arguments(config: SpadeConfig):
+    parser = argparse.ArgumentParser(description='Compare the exported ONNX models run by ONNX Runtime with PyTorch (CPU)')
+
+    parser.add_argument('--model', type=str, default=config.model_name, choices=list(MODELS.keys()))
+    parser.add_argument('--onnx-path', type=str, default=config.onnx_path, help='Directory of exported models')
+    parser.add_argument('--threads', type=int, default=config.onnx_threads, help='ONNX Runtime threads (0 for default)')
+    parser.add_argument('--skip-upscaler', action='store_true', default=False)
+    parser.add_argument('--max-difference', type=int, default=2,
+                        help='Maximum difference of uint8 frame pixels between PyTorch and ONNX Runtime')
+
+    return parser.parse_args()
+
+
+def _compare(name: str, render_torch, render_onnx, max_difference: int) -> bool:
+    start_time = time.perf_counter()
+    torch_frame = render_torch()
+    torch_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    onnx_frame = render_onnx()
+    onnx_time = time.perf_counter() - start_time
+
+    difference = np.abs(torch_frame.astype(np.int16) - onnx_frame.astype(np.int16))
+    print(f'{name:10} torch {torch_time * 1000:8.1f} ms, onnx {onnx_time * 1000:8.1f} ms, '
+          f'max difference {difference.max()}, mean difference {difference.mean():.3f}, '
+          f'PSNR {compute_psnr(torch_frame, onnx_frame):.1f} dB')
+
+    return difference.max() <= max_difference
+
+
+def _compare_generators(config: SpadeConfig, label_map: np.ndarray, max_difference: int) -> bool:
+    # fused like in SpadeAdapter, the exported graph is fused as well
+    model = Pix2PixModel(config, torch.device('cpu'))
+    model.eval()
+    if config.fuse_model_for_inference:
+        model.fuse_for_inference(config.fusion_verification_tolerance)
+
+    torch_engine = BatchedInferenceEngine(model, torch.device('cpu'), 1, 0.0, config.content_resolution)
+    onnx_engine = BatchedInferenceEngine(OnnxPix2PixModel(config), torch.device('cpu'), 1, 0.0, config.content_resolution)
+
+    try:
+        return _compare('generator', lambda: torch_engine.generate([label_map])[0],
+                        lambda: onnx_engine.generate([label_map])[0], max_difference)
+    finally:
+        torch_engine.shutdown()
+        onnx_engine.shutdown()
+
+
+def _compare_upscalers(config: SpadeConfig, frame: np.ndarray, max_difference: int) -> bool:
+    torch_upscaler = ImageUpscaler(config.upscaler_model, config.upscale_scale, 'fp32',
+                                   saturation_factor=config.saturation_factor)
+    onnx_upscaler = OnnxUpscaler(get_upscaler_onnx_path(config), config.upscale_scale, config.onnx_threads,
+                                 saturation_factor=config.saturation_factor)
+
+    for upscaler in (torch_upscaler, onnx_upscaler):
+        upscaler.set_tiling(config.upscaler_tile)
+
+    return _compare('upscaler', lambda: torch_upscaler.upscale(frame), lambda: onnx_upscaler.upscale(frame),
+                    max_difference)
+
+
+if __name__ == "__main__":
+    args = _parse_arguments(SpadeConfig())
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s\t%(levelname)s\t%(message)s')
+
+    config = SpadeConfig(model_name=args.model)
+    config.onnx_path = args.onnx_path
+    config.onnx_threads = args.threads
+
+    label_map = build_reference_label_map(config)
+    width, height = config.content_resolution
+    print(f'{args.model} at {width}x{height}, {torch.get_num_threads()} torch threads')
+
+    parity = _compare_generators(config, label_map, args.max_difference)
+
+    if not args.skip_upscaler:
+        # a generated-looking frame rather than noise, the upscaler output depends on the content
+        frame = np.random.default_rng(0).integers(0, 256, (height // 8, width // 8, 3), dtype=np.uint8)
+        frame = np.ascontiguousarray(np.kron(frame, np.ones((8, 8, 1), dtype=np.uint8)))
+        parity = _compare_upscalers(config, frame, args.max_difference) and parity
+
+    if not parity:
+        print(f'ONNX Runtime frames differ from PyTorch by more than {args.max_difference}')
+        raise SystemExit(1)
@@ -0,0 +1,78 @@
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from image_upscaler.saturation import saturate_image, saturate_image_hsv, saturate_tensor
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser(description='Saturation boost through HSV vs OpenCV arithmetic vs tensor op')
+
+    parser.add_argument('--width', type=int, default=3840)
+    parser.add_argument('--height', type=int, default=1280)
+    parser.add_argument('--factor', type=float, default=1.25)
+    parser.add_argument('--repeats', type=int, default=10)
+
+    return parser.parse_args()
+
+
+def _measure(function, repeats: int, synchronize=None) -> tuple[float, np.ndarray]:
+    output = function()
+
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    if synchronize is not None:
+        synchronize()
+
+    return (time.perf_counter() - start_time) / repeats * 1000, output
+
+
+def _tensor_variant(image: np.ndarray, factor: float, device: torch.device):
+    # as in the upscaler, the image is already on the device as a float tensor and only the uint8 result is copied back
+    tensor = torch.from_numpy(image).to(device).permute(2, 0, 1).unsqueeze(0).float().div_(255)
+
+    def run():
+        output = saturate_tensor(tensor, factor)
+        return output.squeeze(0).permute(1, 2, 0).mul_(255).round_().byte().cpu().numpy()
+
+    return run
+
+
+if __name__ == "__main__":
+    args = _parse_arguments()
+
+    # smooth gradients with a noise on top, closer to generated frames than pure noise
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 1, args.width, dtype=np.float32)
+    y = np.linspace(0, 1, args.height, dtype=np.float32)[:, None]
+    gradients = np.stack([x * y, np.broadcast_to(x, (args.height, args.width)), 1 - y * np.ones_like(x)], axis=2)
+    image = np.clip(gradients * 200 + rng.normal(0, 20, gradients.shape), 0, 255).astype(np.uint8)
+
+    variants = {
+        'hsv': lambda: saturate_image_hsv(image, args.factor),
+        'opencv': lambda: saturate_image(image, args.factor),
+        'tensor cpu': _tensor_variant(image, args.factor, torch.device('cpu')),
+    }
+    synchronizers = {}
+    if torch.cuda.is_available():
+        variants['tensor cuda'] = _tensor_variant(image, args.factor, torch.device('cuda'))
+        synchronizers['tensor cuda'] = torch.cuda.synchronize
+
+    print(f'saturation {args.factor} at {args.width}x{args.height}, {torch.get_num_threads()} threads')
+
+    reference_output = None
+    reference_time = None
+
+    for name, function in variants.items():
+        frame_time, output = _measure(function, args.repeats, synchronizers.get(name))
+
+        if reference_output is None:
+            reference_output = output.astype(np.int16)
+        difference = np.abs(output.astype(np.int16) - reference_output)
+
+        reference_time = reference_time or frame_time
+        print(f'{name:12} {frame_time:8.1f} ms/frame ({reference_time / frame_time:.2f}x), '
+              f'max difference {difference.max()}, mean difference {difference.mean():.2f}')
@@ -0,0 +1,98 @@
+import argparse
+import os
+import time
+
+import torch
+from torch.profiler import profile, ProfilerActivity
+
+from config.modules_configs.spade_config import SpadeConfig, MODELS
+from spade.networks.generator import SPADEGenerator
+from spade.networks.label_pyramid import LabelPyramid
+
+VARIANTS = ['per-layer', 'segmap-pyramid', 'label-pyramid']
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser(description='SPADE segmap downsampling per layer vs shared pyramids (CPU)')
+
+    parser.add_argument('--model', type=str, default='debug_small', choices=list(MODELS.keys()))
+    parser.add_argument('--width', type=int, default=0, help='Content width (model resolution by default)')
+    parser.add_argument('--variants', type=str, nargs='*', default=VARIANTS, choices=VARIANTS)
+    parser.add_argument('--threads', type=int, default=0, help='Torch CPU threads (torch default by default)')
+    parser.add_argument('--repeats', type=int, default=3)
+
+    return parser.parse_args()
+
+
+def _build_generator(args) -> tuple[SPADEGenerator, SpadeConfig]:
+    config = SpadeConfig(model_name=args.model)
+
+    if args.width > 0:
+        config.content_resolution = (args.width, round(args.width / config.aspect_ratio))
+        config.crop_size = args.width
+
+    generator = SPADEGenerator(config)
+    # random weights give the same latency when checkpoints are not available
+    if os.path.exists(config.weights_path):
+        generator.load_state_dict(torch.load(config.weights_path, weights_only=True))
+
+    return generator.eval(), config
+
+
+def _build_input(variant: str, label_map: torch.Tensor, semantic_nc: int):
+    # the label pyramid is built per frame as in Pix2PixModel, so it is part of the measured forward
+    if variant == 'label-pyramid':
+        return LabelPyramid(label_map, semantic_nc)
+
+    batch_size, _, height, width = label_map.size()
+    return torch.zeros(batch_size, semantic_nc, height, width).scatter_(1, label_map, 1.0)
+
+
+def _run(generator: SPADEGenerator, variant: str, label_map: torch.Tensor, semantic_nc: int):
+    generator.use_segmap_pyramid = variant != 'per-layer'
+    return generator(_build_input(variant, label_map, semantic_nc))
+
+
+if __name__ == "__main__":
+    args = _parse_arguments()
+
+    if args.threads > 0:
+        torch.set_num_threads(args.threads)
+
+    generator, config = _build_generator(args)
+    width, height = config.content_resolution
+    semantic_nc = config.label_nc + 1
+
+    label_map = torch.randint(0, semantic_nc, (1, 1, height, width))
+
+    print(f'{args.model} generator at {width}x{height}, {torch.get_num_threads()} threads')
+
+    reference_output = None
+    reference_time = None
+
+    with torch.no_grad():
+        for variant in args.variants:
+            output = _run(generator, variant, label_map, semantic_nc)
+
+            start_time = time.perf_counter()
+            for _ in range(args.repeats):
+                _run(generator, variant, label_map, semantic_nc)
+            frame_time = (time.perf_counter() - start_time) / args.repeats * 1000
+
+            with profile(activities=[ProfilerActivity.CPU]) as profiler:
+                _run(generator, variant, label_map, semantic_nc)
+
+            # downsampling and one-hot construction, the part the pyramids change
+            resampling_ops = {'aten::upsample_nearest2d', 'aten::scatter_', 'aten::zeros'}
+            resampling_events = [event for event in profiler.key_averages() if event.key in resampling_ops]
+            resampling_time = sum(event.self_cpu_time_total for event in resampling_events) / 1000
+            interpolations = sum(event.count for event in resampling_events if event.key == 'aten::upsample_nearest2d')
+
+            if reference_output is None:
+                reference_output = output
+            difference = (output - reference_output).abs().max().item()
+
+            reference_time = reference_time or frame_time
+            print(f'{variant:15} {frame_time:10.1f} ms/frame ({reference_time / frame_time:.2f}x), '
+                  f'resampling {resampling_time:7.1f} ms in {interpolations:3} interpolations, '
+                  f'max difference {difference:.1e}')
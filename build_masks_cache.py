@@ -0,0 +1,64 @@
+import argparse
+import json
+import logging
+import time
+
+from config.integrated_config import IntegratedConfig
+from sequences_manager.masks_cache import MasksCache
+from sequences_manager.process_masks_decoder import ProcessMasksDecoder
+from sequences_manager.sequence import Sequence
+
+
+def _parse_arguments(config: IntegratedConfig):
+    parser = argparse.ArgumentParser(description='Build precompiled masks cache for all sequences')
+
+    parser.add_argument('--cache-path', type=str, default=config.sequence.masks_cache_path,
+                        help='Directory for masks cache files')
+    parser.add_argument('--sequences', type=str, nargs='*', default=None,
+                        help='Sequence names to build (all from mask mapping by default)')
+    parser.add_argument('--force', action='store_true', default=False,
+                        help='Rebuild cache files even if they are up to date')
+    parser.add_argument('--processes', type=int, default=0,
+                        help='Decode mask columns on a pool of this many processes (0 decodes in this process)')
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    config = IntegratedConfig()
+    args = _parse_arguments(config)
+
+    logging.basicConfig(level=config.runtime.log_level, format='%(asctime)s\t%(levelname)s\t%(message)s')
+    logger = logging.getLogger()
+
+    with open(config.sequence.mask_mapping_path) as f:
+        sequences_config = json.load(f)
+
+    masks_cache = MasksCache(args.cache_path)
+    content_size = config.spade.content_resolution
+    max_counter_value = config.timing.max_counter_value
+    masks_decoder = ProcessMasksDecoder(args.processes) if args.processes > 0 else None
+
+    for sequence_name, sequence_config in sequences_config.items():
+        if args.sequences and sequence_name not in args.sequences:
+            continue
+
+        start_time = time.time()
+
+        data_path_root = f'{config.sequence.images_path}/{sequence_name}'
+        cache_key = MasksCache.build_key(sequence_config, data_path_root, sequence_name, content_size, max_counter_value)
+
+        if not args.force and masks_cache.load(sequence_name, cache_key, content_size) is not None:
+            logger.info(f'{sequence_name}: up to date')
+            continue
+
+        sequence = Sequence(
+            sequence_name, sequence_config, content_size, config.spade.output_resolution, max_counter_value
+        )
+        masks_cache.save(sequence_name, cache_key, sequence.decode_layers(data_path_root, masks_decoder))
+
+        logger.info(f'{sequence_name}: cached in {time.time() - start_time:.2f}s '
+                    f'({masks_cache.get_cache_file_path(sequence_name)})')
+
+    if masks_decoder is not None:
+        masks_decoder.shutdown()
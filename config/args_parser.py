@@ -1,6 +1,7 @@
 import argparse
 
 from config.integrated_config import IntegratedConfig
+from spade.precision import PRECISIONS
 
 
 def parse_arguments_and_init_config():
@@ -11,6 +12,8 @@ def parse_arguments_and_init_config():
     config.display.monitor_index = args.monitor
     config.depth.mirror_mode = args.mirror
     config.spade.device_type = args.spade_device
+    config.spade.use_frame_cache_disk = args.frames_store
+    config.spade.precision = args.precision
 
     return config
 
@@ -25,6 +28,10 @@ def _parse_arguments(config: IntegratedConfig):
     parser.add_argument('--disable-spade', action='store_true', default=config.spade.bypass_spade,
                         help='Disable SPADE processing')
     parser.add_argument('--spade-device', type=str, default=config.spade.device_type,
-                        help='Device for SPADE (cuda/mps/cpu/auto)')
+                        help='Device for SPADE (cuda/mps/cpu/auto/onnx)')
+    parser.add_argument('--frames-store', action='store_true', default=config.spade.use_frame_cache_disk,
+                        help='Serve and store generated frames on disk (e.g. pre-rendered with prerender.py)')
+    parser.add_argument('--precision', type=str, default=config.spade.precision, choices=PRECISIONS,
+                        help='SPADE and upscaler precision, checked against fp32 at startup')
 
     return parser.parse_args()
\ No newline at end of file
@@ -8,6 +8,21 @@ class SequenceConfig:
     images_path: str = "data/landscapes"
     overlays_images_path: str = "data/overlays"
 
+    # "threads" decodes each sequence on its loading thread, "processes" fans mask columns out to a process pool
+    masks_decoding_mode: str = "threads"
+    masks_decoding_processes: int = 0  # 0 uses all available cores
+
+    use_masks_cache: bool = True
+    masks_cache_path: str = "data/cache/masks"
+
+    # compressed composed masks kept per (sequence, counters) state, 0 disables memoization
+    masks_memo_max_bytes: int = 64 * 1024 * 1024
+
+    # load only the current and upcoming sequences, keeping at most max_resident_sequences in memory
+    lazy_loading: bool = False
+    max_resident_sequences: int = 3
+    prefetch_sequences_count: int = 1
+
     sequence_mapping_path: str = "data/sequence_config/sequence_mapping.json"
     mask_mapping_path: str = "data/sequence_config/mask_mapping.json"
 
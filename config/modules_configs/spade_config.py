@@ -52,13 +52,77 @@ class SpadeConfig:
 
     colormap: str = cv2.COLORMAP_VIRIDIS
 
+    # cuda/mps/cpu/auto run PyTorch, onnx runs models exported with export_onnx.py on ONNX Runtime (CPU)
     device_type: str = 'auto'
     gpu_ids: list[int] = field(default_factory=lambda: [0])
 
     weights_path: str = ''
 
+    # spectral norms and batch norm statistics baked into plain convolutions, checked against the original generator
+    fuse_model_for_inference: bool = True
+    fusion_verification_tolerance: float | None = 1e-3
+
+    onnx_path: str = 'data/onnx'
+    onnx_threads: int = 0
+
+    # label map fed as class indices with per-resolution downsampling instead of a dense one-hot tensor
+    label_index_input: bool = True
+    # dense segmaps downsampled once per size and shared by all SPADE layers instead of once per layer, same output
+    use_segmap_pyramid: bool = True
+
+    # auto (fp16 on CUDA, fp32 elsewhere), fp32, fp16 (CUDA/MPS) or bf16 (CPU/CUDA) for the generator and the upscaler;
+    # reduced precision falls back to fp32 when a reference frame PSNR against fp32 is below precision_min_psnr
+    precision: str = 'auto'
+    channels_last: bool = False
+    precision_min_psnr: float | None = 35.0
+
+    # generator execution: eager, trace (TorchScript) or compile (torch.compile), warmed up at startup
+    compile_mode: str = 'eager'
+    warm_up_iterations: int = 2
+
+    # SPADE gamma/beta maps are kept between frames and recomputed only around changed labels,
+    # costs the memory of all modulation maps (several GB for the full models)
+    incremental_modulation: bool = False
+
+    # label map generated in overlapping (width, height) tiles blended across the overlap, trading memory for seams;
+    # tile sizes are multiples of the generator upsampling factor (32, 128 for the 'most' models)
+    tile_size: tuple[int, int] | None = None
+    tile_overlap: int = 128
+    tile_workers: int = 1
+
+    # live frames are generated and upscaled on separate workers, so a frame is generated while the previous one is
+    # upscaled; a full stage queue drops its oldest frame for the new one
+    use_frame_pipeline: bool = True
+    frame_pipeline_queue_size: int = 1
+
+    # label maps submitted within inference_max_wait seconds are generated in one forward pass
+    inference_max_batch_size: int = 4
+    inference_max_wait: float = 0.005
+
     upscaler_model: str = 'weights/net_g_18000.pth'
     upscale_scale: int = 2
+    # HSV saturation boost of the upscaled frames, applied on the upscaler device
+    saturation_factor: float = 1.25
+    # tile size (0 upscales whole frames) and tiles upscaled concurrently; auto tuning benchmarks them on the device
+    # at startup and persists the fastest per device, model, precision and resolution (on CPU only the workers count
+    # for upscaler_tile, full frames take seconds there)
+    upscaler_tile: int = 1024
+    upscaler_tile_workers: int = 1
+    upscaler_tile_auto_tune: bool = True
+    upscaler_tiling_path: str = 'data/cache/upscaler_tiling.json'
+
+    # upscalers from the best one; the next is used while a frame takes longer than the frame budget
+    # (counters sampling interval): realesrgan, compact (SRVGGNetCompact) and classical (Lanczos + unsharp mask)
+    upscaler_tiers: list[str] = field(default_factory=lambda: ['realesrgan', 'compact', 'classical'])
+    compact_upscaler_model: str = 'weights/realesr-general-x4v3.pth'
+    compact_upscaler_scale: int = 4
+
+    # generated frames are reused for repeated label maps, optionally persisted as encoded images
+    use_frame_cache: bool = True
+    frame_cache_max_bytes: int = 1024 * 1024 * 1024
+    use_frame_cache_disk: bool = False
+    frame_cache_disk_path: str = 'data/cache/frames'
+    frame_cache_disk_format: str = '.png'
 
     content_resolution: tuple[int, int] = (0, 0)
     output_resolution: tuple[int, int] = (0, 0)
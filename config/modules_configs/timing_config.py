@@ -10,3 +10,6 @@ class TimingConfig:
     continued_detection_epoch_threshold = 1
     max_counter_value = 30
     target_interpolation_frames = 60
+
+    # next counters states rendered ahead while waiting for the next sample, 0 disables speculation
+    speculative_states_count: int = 2
@@ -0,0 +1,106 @@
+import argparse
+import logging
+
+import numpy as np
+import torch
+
+from config.modules_configs.spade_config import SpadeConfig, MODELS
+from spade.onnx_backend import LabelMapGenerator, create_onnx_session, get_generator_onnx_path, \
+    get_upscaler_onnx_path
+from spade.pix2pix_model import Pix2PixModel
+
+
+def _parse_arguments(config: SpadeConfig):
+    parser = argparse.ArgumentParser(description='Export SPADE generator and upscaler to ONNX and check parity with PyTorch')
+
+    parser.add_argument('--model', type=str, default=config.model_name, choices=list(MODELS.keys()))
+    parser.add_argument('--onnx-path', type=str, default=config.onnx_path,
+                        help='Directory for exported models')
+    parser.add_argument('--opset', type=int, default=17)
+    parser.add_argument('--skip-upscaler', action='store_true', default=False)
+    parser.add_argument('--threads', type=int, default=config.onnx_threads,
+                        help='ONNX Runtime threads used for the parity check (0 for default)')
+    parser.add_argument('--tolerance', type=float, default=1e-3,
+                        help='Maximum absolute output difference between PyTorch and ONNX Runtime')
+
+    return parser.parse_args()
+
+
+def _check_parity(name: str, torch_network, onnx_path, threads_count: int, example_input: torch.Tensor,
+                  tolerance: float) -> bool:
+    with torch.no_grad():
+        torch_output = torch_network(example_input).numpy()
+
+    session = create_onnx_session(onnx_path, threads_count)
+    onnx_output, = session.run(None, {session.get_inputs()[0].name: example_input.numpy()})
+
+    max_difference = float(np.abs(torch_output - onnx_output).max())
+    logging.getLogger().info(f'{name}: max difference to PyTorch {max_difference:.2e} (tolerance {tolerance:.1e})')
+
+    return max_difference <= tolerance
+
+
+def export_generator(config: SpadeConfig, args) -> bool:
+    model = Pix2PixModel(config, torch.device('cpu'))
+    model.eval()
+    model.fuse_for_inference(args.tolerance)
+
+    network = LabelMapGenerator(model.netG, config.label_nc + 1).eval()
+
+    width, height = config.content_resolution
+    label_map = torch.randint(0, config.label_nc + 1, (1, 1, height, width)).float()
+
+    onnx_path = get_generator_onnx_path(config)
+    onnx_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with torch.no_grad():
+        torch.onnx.export(
+            network, (label_map,), str(onnx_path), dynamo=False, opset_version=args.opset,
+            input_names=['label'], output_names=['image'],
+            dynamic_axes={'label': {0: 'batch'}, 'image': {0: 'batch'}}
+        )
+    logging.getLogger().info(f'Generator exported to {onnx_path}')
+
+    return _check_parity('generator', network, onnx_path, args.threads, label_map, args.tolerance)
+
+
+def export_upscaler(config: SpadeConfig, args) -> bool:
+    from image_upscaler.image_upscaler import ImageUpscaler
+
+    network = ImageUpscaler.build_network(config.upscale_scale)
+    # same weights selection as RealESRGANer
+    weights = torch.load(config.upscaler_model, map_location='cpu', weights_only=True)
+    network.load_state_dict(weights['params_ema'] if 'params_ema' in weights else weights['params'], strict=True)
+    network.eval()
+
+    image = torch.rand(1, 3, 64, 96)
+
+    onnx_path = get_upscaler_onnx_path(config)
+    onnx_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with torch.no_grad():
+        torch.onnx.export(
+            network, (image,), str(onnx_path), dynamo=False, opset_version=args.opset,
+            input_names=['image'], output_names=['upscaled'],
+            dynamic_axes={'image': {2: 'height', 3: 'width'}, 'upscaled': {2: 'upscaled_height', 3: 'upscaled_width'}}
+        )
+    logging.getLogger().info(f'Upscaler exported to {onnx_path}')
+
+    return _check_parity('upscaler', network, onnx_path, args.threads, image, args.tolerance)
+
+
+if __name__ == "__main__":
+    args = _parse_arguments(SpadeConfig())
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s\t%(levelname)s\t%(message)s')
+
+    config = SpadeConfig(model_name=args.model)
+    config.onnx_path = args.onnx_path
+
+    parity = export_generator(config, args)
+    if not args.skip_upscaler:
+        parity = export_upscaler(config, args) and parity
+
+    if not parity:
+        logging.getLogger().error('ONNX Runtime outputs differ from PyTorch beyond tolerance')
+        raise SystemExit(1)
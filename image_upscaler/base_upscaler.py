@@ -0,0 +1,29 @@
+import numpy as np
+import numpy.typing as npt
+import torch
+
+from image_upscaler.saturation import saturate_image
+
+
+class BaseUpscaler:
+    # uint8 BGR frame in, upscaled and saturated uint8 BGR frame out; upscalers without reduced precision
+    # or tiling keep the no-op setters, so all of them can be configured the same way
+    def __init__(self, scale: int, saturation_factor: float = 1.25):
+        self.scale = scale
+        self.saturation_factor = saturation_factor
+        self.device = torch.device('cpu')
+
+    def enhance(self, cv_image: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
+        raise NotImplementedError
+
+    def increase_saturation(self, image: npt.NDArray[np.uint8], factor: float) -> npt.NDArray[np.uint8]:
+        return saturate_image(image, factor)
+
+    def upscale(self, cv_image: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
+        return self.increase_saturation(self.enhance(cv_image), self.saturation_factor)
+
+    def set_tiling(self, tile: int, workers_count: int = 1):
+        pass
+
+    def set_precision(self, dtype: torch.dtype | None, channels_last: bool = False):
+        pass
@@ -0,0 +1,21 @@
+import cv2
+
+from image_upscaler.base_upscaler import BaseUpscaler
+
+
+class ClassicalUpscaler(BaseUpscaler):
+    # Lanczos resize sharpened with an unsharp mask, no network
+    def __init__(self, scale, unsharp_amount=0.6, unsharp_sigma=1.5, saturation_factor=1.25):
+        super().__init__(scale, saturation_factor)
+
+        self.unsharp_amount = unsharp_amount
+        self.unsharp_sigma = unsharp_sigma
+
+        print(f"[Upscaler] lanczos + unsharp mask | amount={unsharp_amount} | sigma={unsharp_sigma}")
+
+    def enhance(self, cv_image):
+        height, width = cv_image.shape[:2]
+        image = cv2.resize(cv_image, (width * self.scale, height * self.scale), interpolation=cv2.INTER_LANCZOS4)
+
+        blurred = cv2.GaussianBlur(image, (0, 0), self.unsharp_sigma)
+        return cv2.addWeighted(image, 1 + self.unsharp_amount, blurred, -self.unsharp_amount, 0)
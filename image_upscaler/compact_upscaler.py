@@ -0,0 +1,23 @@
+from basicsr.archs.srvgg_arch import SRVGGNetCompact
+
+from image_upscaler.image_upscaler import ImageUpscaler
+
+
+class CompactUpscaler(ImageUpscaler):
+    # SRVGGNetCompact (e.g. realesr-general-x4v3), a plain convolution stack at input resolution
+    # with a single pixel shuffle, a small fraction of the RRDBNet cost
+    def __init__(self, weights_path, scale, network_scale=4, precision='auto', channels_last=False, saturation_factor=1.25):
+        super().__init__(weights_path, network_scale, precision, channels_last, saturation_factor)
+        self.scale = scale
+        self.outscale = scale if scale != network_scale else None
+
+    @staticmethod
+    def build_network(scale):
+        return SRVGGNetCompact(
+            num_in_ch  = 3,
+            num_out_ch = 3,
+            num_feat   = 64,
+            num_conv   = 32,
+            upscale    = scale,
+            act_type   = 'prelu'
+        )
@@ -1,50 +1,95 @@
-import cv2
-import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
 import torch
 from PIL import Image
-from realesrgan import RealESRGANer
 from basicsr.archs.rrdbnet_arch import RRDBNet
 
+from image_upscaler.base_upscaler import BaseUpscaler
+from image_upscaler.tiling import TiledRealESRGANer
+from spade.precision import resolve_precision
+
+
+class ImageUpscaler(BaseUpscaler):
+    def __init__(self, weights_path, scale, precision='auto', channels_last=False, saturation_factor=1.25):
+        super().__init__(scale, saturation_factor)
 
-class ImageUpscaler:
-    def __init__(self, weights_path, scale):
         if torch.cuda.is_available():
-            self.device, self.half = torch.device("cuda"), True
+            self.device = torch.device("cuda")
         elif torch.backends.mps.is_available():
-            self.device, self.half = torch.device("mps"), False
+            self.device = torch.device("mps")
         else:
-            self.device, self.half = torch.device("cpu"), False
+            self.device = torch.device("cpu")
 
-        rrdb = RRDBNet(
-            num_in_ch   = 3,
-            num_out_ch  = 3,
-            num_feat    = 64,
-            num_block   = 23,
-            num_grow_ch = 32,
-            scale       = scale
-        )
-        
-        self.up = RealESRGANer(
+        self.weights_path = weights_path
+        self.autocast_dtype = None
+        # networks of a larger native scale are resized to the target one by RealESRGANer with Lanczos
+        self.outscale = None
+
+        rrdb = self.build_network(scale)
+
+        self.up = TiledRealESRGANer(
             scale      = scale,
             model_path = weights_path,
             model      = rrdb,
             tile       = 1024,
             tile_pad   = 10,
             pre_pad    = 0,
-            half       = self.half,
+            half       = False,
             device     = self.device
         )
-        print(f"[Upscaler] dev={self.device} | fp16={self.half} | tile=1024")
 
-    def increase_saturation(self, image, factor=1.2):
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV).astype(np.float32)
-        hsv[:, :, 1] = hsv[:, :, 1] * factor
-        hsv[:, :, 1] = np.clip(hsv[:, :, 1], 0, 255)
-        return cv2.cvtColor(hsv.astype(np.uint8), cv2.COLOR_HSV2BGR)
+        # on GPUs the saturation is applied to the output tensor before it is copied to the CPU
+        self.up.saturation_factor = saturation_factor if self.device.type != 'cpu' else None
+
+        self.set_precision(resolve_precision(precision, self.device), channels_last)
+        print(f"[Upscaler] dev={self.device} | fp16={self.up.half} | bf16={self.autocast_dtype is not None}")
+
+    def set_tiling(self, tile, workers_count=1):
+        # tile 0 upscales the whole image in one pass
+        self.up.tile_size = tile
+
+        if self.up.executor is not None:
+            self.up.executor.shutdown()
+        self.up.executor = ThreadPoolExecutor(workers_count, thread_name_prefix='upscaler_tile') if workers_count > 1 else None
 
+    def set_precision(self, dtype, channels_last=False):
+        # fp16 converts the network like RealESRGANer does, bf16 runs it under autocast
+        if self.up.half and dtype != torch.float16:
+            self._load_fp32_weights()
+
+        self.up.half = dtype == torch.float16
+        if self.up.half:
+            self.up.model.half()
+
+        self.autocast_dtype = torch.bfloat16 if dtype == torch.bfloat16 else None
+        self.up.model.to(memory_format=torch.channels_last if channels_last else torch.contiguous_format)
+
+    def _load_fp32_weights(self):
+        weights = torch.load(self.weights_path, map_location=torch.device('cpu'), weights_only=True)
+        self.up.model.float()
+        self.up.model.load_state_dict(weights['params_ema' if 'params_ema' in weights else 'params'], strict=True)
+
+    @staticmethod
+    def build_network(scale):
+        return RRDBNet(
+            num_in_ch   = 3,
+            num_out_ch  = 3,
+            num_feat    = 64,
+            num_block   = 23,
+            num_grow_ch = 32,
+            scale       = scale
+        )
+
+    def enhance(self, cv_image):
+        with torch.no_grad(), torch.autocast(device_type=self.device.type, dtype=self.autocast_dtype,
+                                             enabled=self.autocast_dtype is not None):
+            sr_bgr, _ = self.up.enhance(cv_image, outscale=self.outscale)
+
+        return sr_bgr
 
     def upscale(self, cv_image):
-        with torch.no_grad():
-            sr_bgr, _ = self.up.enhance(cv_image)
-            sr_bgr = self.increase_saturation(sr_bgr, 1.25)
+        sr_bgr = self.enhance(cv_image)
+
+        if self.up.saturation_factor is None:
+            sr_bgr = self.increase_saturation(sr_bgr, self.saturation_factor)
         return sr_bgr
\ No newline at end of file
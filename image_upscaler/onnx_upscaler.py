@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from image_upscaler.base_upscaler import BaseUpscaler
+from image_upscaler.tiling import process_tiles
+from spade.onnx_backend import create_onnx_session
+
+
+class OnnxUpscaler(BaseUpscaler):
+    # same pre/post processing and tiling as RealESRGANer.enhance, with the network run by ONNX Runtime
+    def __init__(self, onnx_path, scale, threads_count=0, tile=1024, tile_pad=10, saturation_factor=1.25):
+        super().__init__(scale, saturation_factor)
+
+        self.session = create_onnx_session(onnx_path, threads_count)
+        self.input_name = self.session.get_inputs()[0].name
+
+        self.tile = tile
+        self.tile_pad = tile_pad
+        self.executor = None
+        # the x2 network works on pixel-unshuffled input, so sizes have to be even
+        self.mod_scale = 2 if scale == 2 else (4 if scale == 1 else None)
+
+        print(f"[Upscaler] onnxruntime | threads={threads_count or 'default'}")
+
+    def enhance(self, cv_image):
+        image = cv2.cvtColor(cv_image.astype(np.float32) / 255.0, cv2.COLOR_BGR2RGB)
+        image = image.transpose(2, 0, 1)[np.newaxis]
+
+        height, width = image.shape[2:]
+        mod_pad_height, mod_pad_width = 0, 0
+        if self.mod_scale is not None:
+            mod_pad_height = (self.mod_scale - height % self.mod_scale) % self.mod_scale
+            mod_pad_width = (self.mod_scale - width % self.mod_scale) % self.mod_scale
+            image = np.pad(image, ((0, 0), (0, 0), (0, mod_pad_height), (0, mod_pad_width)), mode='reflect')
+
+        output = self.tile_process(image) if self.tile > 0 else self.session.run(None, {self.input_name: image})[0]
+
+        output_height, output_width = output.shape[2:]
+        output = output[:, :, :output_height - mod_pad_height * self.scale, :output_width - mod_pad_width * self.scale]
+
+        output = np.clip(output[0], 0, 1)[[2, 1, 0]].transpose(1, 2, 0)
+        return (output * 255.0).round().astype(np.uint8)
+
+    def tile_process(self, image):
+        _, channels, height, width = image.shape
+        output = np.zeros((1, channels, height * self.scale, width * self.scale), dtype=np.float32)
+
+        run_tile = lambda input_tile: self.session.run(None, {self.input_name: np.ascontiguousarray(input_tile)})[0]
+        process_tiles(image, output, run_tile, self.tile, self.tile_pad, self.scale, self.executor)
+
+        return output
+
+    def set_tiling(self, tile, workers_count=1):
+        self.tile = tile
+
+        if self.executor is not None:
+            self.executor.shutdown()
+        self.executor = ThreadPoolExecutor(workers_count, thread_name_prefix='upscaler_tile') if workers_count > 1 else None
@@ -0,0 +1,43 @@
+import cv2
+import numpy as np
+import numpy.typing as npt
+import torch
+
+# Scaling HSV saturation by |factor| keeps hue and value (the max channel), and for a fixed hue every channel c is
+# V - S * V * g(hue), so the adjusted channels are c' = V - k * (V - c) with k = min(factor, V / (V - min)),
+# the cap standing for the saturation clipped at its maximum. No colour space conversion is needed.
+
+
+def saturate_tensor(image: torch.Tensor, factor: float) -> torch.Tensor:
+    # (N, 3, H, W) in [0, 1], any channel order, on the device it already is
+    value = image.amax(dim=1, keepdim=True)
+    spread = value - image.amin(dim=1, keepdim=True)
+
+    k = torch.clamp(value / spread.clamp_min(1e-6), max=factor)
+    return value - k * (value - image)
+
+
+def saturate_image(image: npt.NDArray[np.uint8], factor: float) -> npt.NDArray[np.uint8]:
+    # uint8 BGR already on the CPU, single channel OpenCV arithmetic instead of float HSV buffers
+    if factor == 1.0:
+        return image
+
+    channels = cv2.split(image)
+    value = cv2.max(cv2.max(channels[0], channels[1]), channels[2])
+    spread = cv2.subtract(value, cv2.min(cv2.min(channels[0], channels[1]), channels[2]))
+
+    # division by a zero spread gives 0, gray pixels stay as they are
+    k = cv2.min(cv2.divide(value, spread, dtype=cv2.CV_32F), factor)
+
+    return cv2.merge([
+        cv2.subtract(value, cv2.multiply(cv2.subtract(value, channel), k, dtype=cv2.CV_8U))
+        for channel in channels
+    ])
+
+
+def saturate_image_hsv(image: npt.NDArray[np.uint8], factor: float) -> npt.NDArray[np.uint8]:
+    # reference implementation through OpenCV HSV
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV).astype(np.float32)
+    hsv[:, :, 1] = hsv[:, :, 1] * factor
+    hsv[:, :, 1] = np.clip(hsv[:, :, 1], 0, 255)
+    return cv2.cvtColor(hsv.astype(np.uint8), cv2.COLOR_HSV2BGR)
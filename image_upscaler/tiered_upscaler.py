@@ -0,0 +1,98 @@
+import logging
+import threading
+import time
+
+import numpy as np
+import numpy.typing as npt
+
+from image_upscaler.base_upscaler import BaseUpscaler
+
+UPSCALER_TIERS = ['realesrgan', 'compact', 'classical']
+
+
+class TieredUpscaler:
+    # upscalers from the best to the cheapest one; with a frame budget the cheaper tiers are used while
+    # generation and upscaling of a frame take longer than the budget, and left when there is headroom again;
+    # pipelined generation and upscaling overlap across frames, so the slower of them has to fit the budget
+    def __init__(self, tiers: list[tuple[str, BaseUpscaler]], frame_budget: float | None = None,
+                 headroom: float = 0.8, probe_interval: int = 30, smoothing: float = 0.3, pipelined: bool = False):
+        self.logger = logging.getLogger()
+
+        self.tiers = tiers
+        self.tier_index = 0
+
+        self._frame_budget = frame_budget
+        self._headroom = headroom
+        self._probe_interval = probe_interval
+        self._smoothing = smoothing
+        self._pipelined = pipelined
+
+        self._upscale_times: list[float | None] = [None] * len(tiers)
+        self._generation_time = None
+        self._frames_in_tier = 0
+        self._lock = threading.Lock()
+        # upscalers keep the frame being upscaled on the instance, so each one upscales a single frame at a time
+        upscale_locks = {}
+        self._upscale_locks = [upscale_locks.setdefault(id(upscaler), threading.Lock()) for _, upscaler in tiers]
+
+    @property
+    def tier_name(self) -> str:
+        return self.tiers[self.tier_index][0]
+
+    def set_tier(self, name: str):
+        with self._lock:
+            self.tier_index = [tier_name for tier_name, _ in self.tiers].index(name)
+            self._frames_in_tier = 0
+
+    def upscale(self, image: npt.NDArray[np.uint8], generation_time: float = 0.0) -> tuple[npt.NDArray[np.uint8], int]:
+        tier_index = self.tier_index
+
+        with self._upscale_locks[tier_index]:
+            start_time = time.perf_counter()
+            upscaled = self.tiers[tier_index][1].upscale(image)
+            upscale_time = time.perf_counter() - start_time
+
+        with self._lock:
+            self._upscale_times[tier_index] = self._smooth(self._upscale_times[tier_index], upscale_time)
+            self._generation_time = self._smooth(self._generation_time, generation_time)
+
+            if self._frame_budget is not None and tier_index == self.tier_index:
+                self._update_tier()
+
+        return upscaled, tier_index
+
+    def _smooth(self, average: float | None, value: float) -> float:
+        return value if average is None else average + self._smoothing * (value - average)
+
+    def _update_tier(self):
+        self._frames_in_tier += 1
+        frame_time = self._get_frame_time(self._upscale_times[self.tier_index])
+
+        if frame_time > self._frame_budget and self.tier_index < len(self.tiers) - 1:
+            self._change_tier(self.tier_index + 1, f'frame {frame_time:.2f}s over budget {self._frame_budget:.2f}s')
+            return
+
+        if self.tier_index == 0:
+            return
+
+        # the better tier time is from when it was last used, so it is measured again from time to time
+        if self._upscale_times[self.tier_index - 1] is None:
+            self._change_tier(self.tier_index - 1, 'not measured yet')
+            return
+
+        better_frame_time = self._get_frame_time(self._upscale_times[self.tier_index - 1])
+        if better_frame_time <= self._headroom * self._frame_budget:
+            self._change_tier(self.tier_index - 1, f'estimated frame {better_frame_time:.2f}s within budget')
+        elif self._frames_in_tier >= self._probe_interval:
+            self._change_tier(self.tier_index - 1, 'probing')
+
+    def _get_frame_time(self, upscale_time: float) -> float:
+        if self._pipelined:
+            return max(self._generation_time, upscale_time)
+
+        return self._generation_time + upscale_time
+
+    def _change_tier(self, tier_index: int, reason: str):
+        self.logger.info(f'Upscaler tier {self.tier_name} -> {self.tiers[tier_index][0]} ({reason})')
+        self.tier_index = tier_index
+        self._frames_in_tier = 0
@@ -0,0 +1,164 @@
+import json
+import logging
+import math
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+from realesrgan import RealESRGANer
+
+from image_upscaler.saturation import saturate_tensor
+
+TILE_CANDIDATES = [256, 384, 512, 768, 1024, 0]
+
+
+def build_tiles(height, width, tile, tile_pad, scale):
+    # (padded input region, output region, output region within the upscaled padded tile) of every tile,
+    # in the same layout as RealESRGANer.tile_process
+    tiles = []
+
+    for tile_y in range(math.ceil(height / tile)):
+        for tile_x in range(math.ceil(width / tile)):
+            input_start_x, input_start_y = tile_x * tile, tile_y * tile
+            input_end_x, input_end_y = min(input_start_x + tile, width), min(input_start_y + tile, height)
+
+            input_start_x_pad, input_end_x_pad = max(input_start_x - tile_pad, 0), min(input_end_x + tile_pad, width)
+            input_start_y_pad, input_end_y_pad = max(input_start_y - tile_pad, 0), min(input_end_y + tile_pad, height)
+
+            output_start_x_tile = (input_start_x - input_start_x_pad) * scale
+            output_start_y_tile = (input_start_y - input_start_y_pad) * scale
+
+            tiles.append((
+                (slice(input_start_y_pad, input_end_y_pad), slice(input_start_x_pad, input_end_x_pad)),
+                (slice(input_start_y * scale, input_end_y * scale), slice(input_start_x * scale, input_end_x * scale)),
+                (slice(output_start_y_tile, output_start_y_tile + (input_end_y - input_start_y) * scale),
+                 slice(output_start_x_tile, output_start_x_tile + (input_end_x - input_start_x) * scale))
+            ))
+
+    return tiles
+
+
+def process_tiles(image, output, run_tile, tile, tile_pad, scale, executor=None):
+    # works on numpy arrays and tensors alike, tiles are independent so they can run concurrently
+    height, width = image.shape[2:]
+    tiles = build_tiles(height, width, tile, tile_pad, scale)
+
+    def process_tile(tile_regions):
+        (input_y, input_x), (output_y, output_x), (crop_y, crop_x) = tile_regions
+        output[:, :, output_y, output_x] = run_tile(image[:, :, input_y, input_x])[:, :, crop_y, crop_x]
+
+    if executor is not None and len(tiles) > 1:
+        list(executor.map(process_tile, tiles))
+    else:
+        for tile_regions in tiles:
+            process_tile(tile_regions)
+
+
+class TiledRealESRGANer(RealESRGANer):
+    # RealESRGANer with tiles optionally run on a thread pool, without the per tile prints,
+    # and the saturation optionally applied on the device
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.executor = None
+        self.saturation_factor = None
+
+    def post_process(self):
+        output = super().post_process()
+
+        if self.saturation_factor is not None:
+            self.output = saturate_tensor(output.float().clamp_(0, 1), self.saturation_factor)
+
+        return self.output
+
+    def tile_process(self):
+        _, channels, height, width = self.img.shape
+        self.output = self.img.new_zeros(1, channels, height * self.scale, width * self.scale)
+
+        # grad and autocast modes are per thread, the workers take the caller's
+        device_type = self.device.type
+        autocast_enabled = torch.is_autocast_enabled(device_type)
+        autocast_dtype = torch.get_autocast_dtype(device_type)
+
+        def run_tile(input_tile):
+            with torch.no_grad(), torch.autocast(device_type=device_type, dtype=autocast_dtype, enabled=autocast_enabled):
+                return self.model(input_tile)
+
+        process_tiles(self.img, self.output, run_tile, self.tile_size, self.tile_pad, self.scale, self.executor)
+
+
+def get_workers_candidates(device_type: str) -> list[int]:
+    # concurrent tiles only pay off on CPU, where a single tile does not fill all cores
+    if device_type != 'cpu':
+        return [1]
+
+    return sorted({1, 2, min(4, torch.get_num_threads())})
+
+
+def get_tile_candidates(device_type: str, tile: int) -> list[int]:
+    # a full frame takes seconds on CPU, only the number of workers is tuned there for the configured tile
+    if device_type == 'cpu':
+        return [tile]
+
+    return TILE_CANDIDATES
+
+
+def tune_tiling(upscaler, image: np.ndarray, device_type: str, tile_candidates: list[int] = TILE_CANDIDATES,
+                repeats: int = 1) -> tuple[int, int, float]:
+    logger = logging.getLogger()
+    height, width = image.shape[:2]
+
+    best = None
+    tested_grids = set()
+
+    # larger tiles than the first one not fitting in memory do not fit either, the sweep stops there
+    for tile in sorted(tile_candidates, key=lambda candidate: candidate if candidate > 0 else math.inf):
+        # tiles covering the image are the same as no tiling
+        grid = (math.ceil(height / tile), math.ceil(width / tile)) if tile > 0 else (1, 1)
+        if grid in tested_grids:
+            continue
+        tested_grids.add(grid)
+
+        for workers_count in get_workers_candidates(device_type) if grid != (1, 1) else [1]:
+            upscaler.set_tiling(tile, workers_count)
+
+            try:
+                # the first run initializes CUDA kernels and allocator pools
+                if device_type != 'cpu':
+                    upscaler.upscale(image)
+
+                start_time = time.perf_counter()
+                for _ in range(repeats):
+                    upscaler.upscale(image)
+                frame_time = (time.perf_counter() - start_time) / repeats
+            except (torch.cuda.OutOfMemoryError, MemoryError):
+                logger.info(f'Upscaler tile {tile} does not fit in memory')
+                if device_type == 'cuda':
+                    torch.cuda.empty_cache()
+
+                assert best is not None, 'no upscaler tiling fits in memory'
+                return best
+
+            logger.info(f'Upscaler tile {tile}, {workers_count} workers: {frame_time * 1000:.1f} ms')
+            if best is None or frame_time < best[2]:
+                best = (tile, workers_count, frame_time)
+
+    assert best is not None, 'no upscaler tiling fits in memory'
+    return best
+
+
+def load_tiling(settings_path: str, key: str) -> dict | None:
+    path = Path(settings_path)
+    if not path.exists():
+        return None
+
+    return json.loads(path.read_text()).get(key)
+
+
+def save_tiling(settings_path: str, key: str, tiling: dict):
+    path = Path(settings_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    settings = json.loads(path.read_text()) if path.exists() else {}
+    settings[key] = tiling
+    path.write_text(json.dumps(settings, indent=2))
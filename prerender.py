@@ -0,0 +1,134 @@
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+
+from config.integrated_config import IntegratedConfig
+from sequences_manager.masks_cache import MasksCache
+from sequences_manager.sequence import Sequence
+from spade.frame_cache import FrameCache, INDEX_FILE_NAME
+from spade.spade_adapter import SpadeAdapter
+
+STATES_KINDS = ['uniform', 'ramps']
+
+
+def _parse_arguments(config: IntegratedConfig):
+    parser = argparse.ArgumentParser(description='Pre-render generated frames of sequences into the frames store')
+
+    parser.add_argument('--frames-path', type=str, default=config.spade.frame_cache_disk_path,
+                        help='Directory of the frames store')
+    parser.add_argument('--sequences', type=str, nargs='*', default=None,
+                        help='Sequence names to render (all from mask mapping by default)')
+    parser.add_argument('--states', type=str, nargs='*', choices=STATES_KINDS, default=STATES_KINDS,
+                        help='Counter states to render: uniform levels of all columns and/or single column ramps')
+    parser.add_argument('--step', type=int, default=1,
+                        help='Counter value step between rendered states')
+    parser.add_argument('--spade-device', type=str, default=config.spade.device_type,
+                        help='Device for SPADE (cuda/mps/cpu/auto)')
+    parser.add_argument('--force', action='store_true', default=False,
+                        help='Render frames even if they are already in the store')
+
+    return parser.parse_args()
+
+
+def build_counters(base_counters: np.ndarray) -> np.ndarray:
+    # same layout as in MainPipeline: base counters, global, left, center, right
+    sides_counters = base_counters.reshape(3, -1).max(axis=1)
+    return np.concatenate([base_counters, [sides_counters.max()], sides_counters]).astype(int)
+
+
+def build_states(states_kinds: list[str], base_counters_count: int, max_counter_value: int,
+                 step: int) -> list[np.ndarray]:
+    levels = list(range(0, max_counter_value + 1, step))
+    if levels[-1] != max_counter_value:
+        levels.append(max_counter_value)
+
+    states = []
+
+    if 'uniform' in states_kinds:
+        states.extend(build_counters(np.full(base_counters_count, level)) for level in levels)
+
+    if 'ramps' in states_kinds:
+        for column_index in range(base_counters_count):
+            for level in levels[1:]:
+                base_counters = np.zeros(base_counters_count, dtype=int)
+                base_counters[column_index] = level
+                states.append(build_counters(base_counters))
+
+    return states
+
+
+if __name__ == "__main__":
+    config = IntegratedConfig()
+    args = _parse_arguments(config)
+
+    logging.basicConfig(level=config.runtime.log_level, format='%(asctime)s\t%(levelname)s\t%(message)s')
+    logger = logging.getLogger()
+
+    config.spade.device_type = args.spade_device
+    # frames are written synchronously to the store below, the adapter's own cache is not needed
+    config.spade.use_frame_cache = False
+
+    with open(config.sequence.mask_mapping_path) as f:
+        sequences_config = json.load(f)
+
+    spade_adapter = SpadeAdapter(config.spade)
+    frames_store = FrameCache(0, spade_adapter.get_frame_cache_salt(), args.frames_path,
+                              config.spade.frame_cache_disk_format)
+    masks_cache = MasksCache(config.sequence.masks_cache_path) if config.sequence.use_masks_cache else None
+
+    content_size = config.spade.content_resolution
+    max_counter_value = config.timing.max_counter_value
+    states = build_states(args.states, config.depth.counters_count, max_counter_value, args.step)
+
+    index_path = Path(args.frames_path) / INDEX_FILE_NAME
+    index = json.loads(index_path.read_text()) if index_path.exists() else {}
+
+    for sequence_name, sequence_config in sequences_config.items():
+        if args.sequences and sequence_name not in args.sequences:
+            continue
+
+        start_time = time.time()
+
+        sequence = Sequence(
+            sequence_name, sequence_config, content_size, config.spade.output_resolution, max_counter_value
+        )
+        sequence.load_data(config.sequence.images_path, config.sequence.overlays_images_path, masks_cache)
+
+        sequence_index = {}
+        processed_keys = set()
+        rendered_count = 0
+
+        for counters in states:
+            label_map = sequence.build_image(counters)
+            frame_key = frames_store.build_key(label_map)
+            sequence_index[','.join(str(counter) for counter in counters)] = frame_key
+
+            # different states often compose the same label map
+            if frame_key in processed_keys:
+                continue
+            processed_keys.add(frame_key)
+
+            if not args.force and frames_store.get_disk_file_path(frame_key).exists():
+                continue
+
+            frames_store.write_to_disk(frame_key, spade_adapter.process_mask(label_map), overwrite=True)
+            rendered_count += 1
+
+        sequence.unload_data()
+
+        index[sequence_name] = {
+            'frame_key_salt': spade_adapter.get_frame_cache_salt(),
+            'states': sequence_index
+        }
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        index_path.write_text(json.dumps(index, indent=2))
+
+        logger.info(f'{sequence_name}: {rendered_count} frames rendered, '
+                    f'{len(processed_keys)} unique of {len(states)} states '
+                    f'in {time.time() - start_time:.2f}s')
+
+    spade_adapter.cleanup()
@@ -1,8 +1,11 @@
 import logging
 import threading
 
+from concurrent.futures import Future
+
 import numpy as np
 
+import reactivex
 from reactivex import Subject, combine_latest
 from reactivex.scheduler import NewThreadScheduler, EventLoopScheduler
 
@@ -10,6 +13,7 @@ from reactivex import operators as ops
 
 from config.integrated_config import IntegratedConfig
 from movement_detector.movement_detector import build_detection_counters_stream, build_detection_counters_updates_stream
+from scheduler.speculative_generator import SpeculativeGenerator
 from scheduler.utils import overlay_images
 from sequences_manager.sequences_manager import SequencesManager
 from spade.spade_adapter import SpadeAdapter
@@ -34,6 +38,7 @@ class MainPipeline:
 
         self.sequences_manager: SequencesManager | None = None
         self.spade_adapter: SpadeAdapter | None = None
+        self.speculative_generator: SpeculativeGenerator | None = None
 
         self._continuous_stream_connection = None
         self._subscription = None
@@ -45,15 +50,23 @@ class MainPipeline:
         test_animation_mode = self.config.runtime.test_animation_mode
 
         def build_image_generation_objects(_, __):
-            self.spade_adapter = SpadeAdapter(self.config.spade)
+            self.spade_adapter = SpadeAdapter(self.config.spade, self.config.timing.counters_sampling_interval)
 
             self.sequences_manager = SequencesManager(self.config)
+            self.sequences_manager.sequences_status.subscribe(app.update_sequence_display)
             self.sequences_manager.load_masks_data().subscribe(
                 on_next=app.update_sequence_display,
                 on_error=lambda error: self.logger.exception(error),
                 on_completed=lambda: self.sequence_switcher.on_next('start')
             )
 
+            # speculative frames are only useful when generated frames are cached
+            if self.config.timing.speculative_states_count > 0 and self.spade_adapter.frame_cache is not None:
+                self.speculative_generator = SpeculativeGenerator(
+                    self.spade_adapter, self.sequences_manager, max_counter_value,
+                    self.config.timing.speculative_states_count
+                )
+
             self.current_frame_subject.pipe(
                 ops.observe_on(self.transition_scheduler),
                 ops.start_with(self.spade_adapter.get_empty_frame()),
@@ -74,6 +87,7 @@ class MainPipeline:
                 lambda _: build_detection_counters_updates_stream(
                     detections_stream.pipe(
                         ops.do_action(lambda detections: app.update_detections(detections)),
+                        ops.do_action(self._update_speculative_detections),
                     ),
                     self.config
                 ).pipe(
@@ -96,8 +110,14 @@ class MainPipeline:
                     ops.publish(lambda shared_counters: combine_latest(
                         shared_counters.pipe(
                             ops.observe_on(self.spade_processing_scheduler),
+                            ops.do_action(self._on_speculative_counters),
                             ops.map(self.sequences_manager.get_sequence_image),
-                            ops.map(self.spade_adapter.process_mask),
+                            ops.map(self.spade_adapter.submit_frame),
+                            ops.concat_map(self._observe_frame),
+                            ops.do_action(lambda _: self._speculate_next_frames()),
+                            ops.do_action(lambda _: app.update_frame_cache_stats(self.spade_adapter.get_frame_cache_stats())),
+                            ops.do_action(lambda _: app.update_frame_pipeline_stats(self.spade_adapter.get_frame_pipeline_stats())),
+                            ops.do_action(lambda _: app.update_speculative_stats(self._get_speculative_stats())),
                             ops.start_with(None)
                         ),
                         shared_counters.pipe(
@@ -121,6 +141,38 @@ class MainPipeline:
             on_completed=lambda: self.logger.info("Pipeline closed")
         )
 
+    @staticmethod
+    def _observe_frame(frame: Future):
+        # frames dropped by the frame pipeline for newer ones complete without a value
+        def subscribe(observer, _=None):
+            def on_done(_):
+                if frame.cancelled():
+                    observer.on_completed()
+                elif frame.exception() is not None:
+                    observer.on_error(frame.exception())
+                else:
+                    observer.on_next(frame.result())
+                    observer.on_completed()
+
+            frame.add_done_callback(on_done)
+
+        return reactivex.create(subscribe)
+
+    def _update_speculative_detections(self, detections):
+        if self.speculative_generator is not None:
+            self.speculative_generator.update_detections(detections)
+
+    def _on_speculative_counters(self, counters):
+        if self.speculative_generator is not None:
+            self.speculative_generator.on_counters(counters)
+
+    def _get_speculative_stats(self):
+        return self.speculative_generator.stats if self.speculative_generator is not None else None
+
+    def _speculate_next_frames(self):
+        if self.speculative_generator is not None:
+            self.speculative_generator.speculate()
+
     def _extend_counters_updates(self, counters_updates):
         assert len(counters_updates) % 3 == 0, "counters count has to be a multiple of 3"
 
@@ -156,7 +208,14 @@ class MainPipeline:
         self._continuous_stream_connection.dispose()
         self._subscription.dispose()
 
+        if self.speculative_generator is not None:
+            self.speculative_generator.shutdown()
+
         if self.spade_adapter is not None:
+            self.spade_adapter.cleanup()
             self.spade_adapter.model = None
 
+        if self.sequences_manager is not None:
+            self.sequences_manager.cleanup()
+
         self.logger.info('DONE')
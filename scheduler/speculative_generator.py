@@ -0,0 +1,140 @@
+import logging
+import threading
+import time
+from concurrent.futures import CancelledError, Future
+
+import numpy as np
+import numpy.typing as npt
+from reactivex.scheduler import EventLoopScheduler
+
+from sequences_manager.sequences_manager import SequencesManager
+from spade.spade_adapter import SpadeAdapter
+
+
+def build_next_counters(counters: npt.NDArray[np.int_], columns_updates: npt.NDArray[np.int_],
+                        max_counter_value: int) -> npt.NDArray[np.int_]:
+    # mirrors MainPipeline: base counters, global, left, center, right
+    base_counters_count = len(columns_updates)
+    sides_updates = columns_updates.reshape(3, -1).max(axis=1)
+
+    next_counters = np.array(counters, copy=True)
+    next_counters[:base_counters_count] += columns_updates
+    next_counters[base_counters_count + 1:] += sides_updates
+    next_counters = np.minimum(next_counters, max_counter_value)
+    next_counters[base_counters_count] = next_counters[base_counters_count + 1:].max()
+
+    return next_counters
+
+
+class SpeculativeGenerator:
+    def __init__(self, spade_adapter: SpadeAdapter, sequences_manager: SequencesManager,
+                 max_counter_value: int, states_count: int):
+        self.logger = logging.getLogger()
+
+        self._spade_adapter = spade_adapter
+        self._sequences_manager = sequences_manager
+        self._max_counter_value = max_counter_value
+        self._states_count = states_count
+
+        self._columns = None
+        self._counters = None
+        # bumped by every real frame request, so pending speculation is dropped as soon as it is stale
+        self._generation = 0
+        self._generating: list[Future] = []
+        self._lock = threading.Lock()
+
+        self._scheduler = EventLoopScheduler()
+
+        self.rendered_states = 0
+        self.skipped_states = 0
+
+    def update_detections(self, detections: dict):
+        self._columns = np.asarray(detections['columns']).astype(int)
+
+    def on_counters(self, counters: npt.NDArray[np.int_]):
+        with self._lock:
+            self._generation += 1
+            self._counters = np.array(counters, copy=True)
+
+            # the live frame goes first, speculative masks still waiting for the generator are dropped
+            for future in self._generating:
+                future.cancel()
+            self._generating = []
+
+    def speculate(self):
+        with self._lock:
+            generation = self._generation
+            counters = self._counters
+
+        if counters is None or self._columns is None:
+            return
+
+        self._scheduler.schedule(lambda *_: self._render_next_states(generation, counters, self._columns))
+
+    def get_next_states(self, counters: npt.NDArray[np.int_], columns: npt.NDArray[np.int_]) -> list[npt.NDArray[np.int_]]:
+        detecting_columns = np.flatnonzero(columns > 0)
+
+        # all detecting columns advancing together is the most likely outcome, then each of them alone
+        candidate_updates = [columns > 0]
+        if len(detecting_columns) > 1:
+            for column_index in detecting_columns:
+                single_column_update = np.zeros(len(columns), dtype=bool)
+                single_column_update[column_index] = True
+                candidate_updates.append(single_column_update)
+
+        next_states = []
+        for columns_updates in candidate_updates:
+            next_counters = build_next_counters(counters, columns_updates.astype(int), self._max_counter_value)
+
+            if np.array_equal(next_counters, counters) or any(np.array_equal(next_counters, state) for state in next_states):
+                continue
+
+            next_states.append(next_counters)
+
+        return next_states[:self._states_count]
+
+    def _render_next_states(self, generation: int, counters: npt.NDArray[np.int_], columns: npt.NDArray[np.int_]):
+        states = []
+        for next_counters in self.get_next_states(counters, columns):
+            try:
+                label_map = self._sequences_manager.get_sequence_image(next_counters)
+            except Exception as error:
+                self.logger.warning(f'Speculative label map of {next_counters.tolist()} failed: {error}')
+                continue
+
+            frame_key = self._spade_adapter.frame_cache.build_key(label_map)
+            if not self._spade_adapter.is_frame_known(frame_key):
+                states.append((next_counters, label_map, frame_key))
+
+        # all states are submitted together, so they are generated in one batch
+        with self._lock:
+            if generation != self._generation:
+                self.skipped_states += len(states)
+                return
+
+            start_time = time.time()
+            futures = [self._spade_adapter.submit_mask(label_map, speculative=True) for _, label_map, _ in states]
+            self._generating = futures
+
+        for (next_counters, _, frame_key), future in zip(states, futures):
+            try:
+                image = future.result()
+
+                # a requested live frame is not kept waiting for the upscaler
+                if generation != self._generation:
+                    self.skipped_states += 1
+                    continue
+
+                if self._spade_adapter.store_speculative_frame(frame_key, image, time.time() - start_time):
+                    self.rendered_states += 1
+            except CancelledError:
+                self.skipped_states += 1
+            except Exception as error:
+                self.logger.warning(f'Speculative generation of {next_counters.tolist()} failed: {error}')
+
+    @property
+    def stats(self) -> dict:
+        return {'rendered': self.rendered_states, 'skipped': self.skipped_states}
+
+    def shutdown(self):
+        self._scheduler.dispose()
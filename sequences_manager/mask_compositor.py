@@ -0,0 +1,78 @@
+import cv2
+import numpy as np
+import numpy.typing as npt
+
+from sequences_manager.packed_mask import build_unpack_table
+from sequences_manager.sequence_layer import SequenceLayer
+
+# Layers are encoded as bits of a per-pixel byte, so one chunk can hold at most 8 layers.
+MAX_LAYERS_PER_CHUNK = 8
+
+
+class _LayersChunk:
+    def __init__(self, layers: list[SequenceLayer]):
+        self.layers = layers
+
+        # layer i sets bit i of the word; the lowest set bit wins, so the first layer is the top-most one
+        self.bits_tables = [build_unpack_table(1 << bit) for bit in range(len(layers))]
+
+        words = np.arange(256, dtype=np.int64)
+        lowest_bits = np.zeros_like(words)
+        lowest_bits[1:] = np.log2(words[1:] & -words[1:]).astype(np.int64)
+
+        shades = np.zeros(8, dtype=np.uint8)
+        shades[:len(layers)] = [layer.gray_shade for layer in layers]
+        self.labels_lookup = np.where(words > 0, shades[lowest_bits], 0).astype(np.uint8)
+
+
+class MaskCompositor:
+    # layers are given in precedence order, the first layer is drawn on top of all others
+    def __init__(self, layers: list[SequenceLayer], content_size: (int, int)):
+        width, height = content_size
+        packed_width = (width + 7) // 8
+
+        # layers without shade never show up in the label map
+        layers = [layer for layer in layers if layer.gray_shade > 0]
+
+        self._chunks = [
+            _LayersChunk(layers[chunk_start:chunk_start + MAX_LAYERS_PER_CHUNK])
+            for chunk_start in range(0, len(layers), MAX_LAYERS_PER_CHUNK)
+        ]
+
+        # flat buffers reshaped to the composed region, so every view stays contiguous
+        self._packed_buffer = np.empty(height * packed_width, dtype=np.uint8)
+        self._bits_buffer = np.empty(height * packed_width * 8, dtype=np.uint8)
+        self._word_buffer = np.empty(height * packed_width * 8, dtype=np.uint8)
+        self._labels_buffer = np.empty(height * packed_width * 8, dtype=np.uint8)
+        self._chunk_labels_buffer = np.empty(height * packed_width * 8, dtype=np.uint8)
+
+    def compose(self, counters: npt.NDArray[np.uint8], region: tuple[int, int, int, int],
+                out: npt.NDArray[np.uint8]):
+        y_start, y_end, x_start, x_end = region
+        height, width = y_end - y_start, x_end - x_start
+        packed_width = (x_end + 7) // 8 - x_start // 8
+
+        packed = self._packed_buffer[:height * packed_width].reshape(height, packed_width)
+        bits = self._bits_buffer[:height * packed_width * 8].reshape(height, packed_width, 8)
+        word = self._word_buffer[:height * packed_width * 8].reshape(height, packed_width * 8)
+        labels = self._labels_buffer[:height * packed_width * 8].reshape(height, packed_width * 8)
+
+        labels.fill(0)
+
+        # chunks are painted bottom-up, within a chunk the precedence is resolved by a single lookup
+        for chunk_index, chunk in enumerate(reversed(self._chunks)):
+            word.fill(0)
+
+            for layer, bits_table in zip(chunk.layers, chunk.bits_tables):
+                layer_packed = layer.build_packed_layer(counters, region, out=packed)
+                np.take(bits_table, layer_packed, axis=0, out=bits, mode='clip')
+                np.bitwise_or(word, bits.reshape(word.shape), out=word)
+
+            if chunk_index == 0:
+                cv2.LUT(word, chunk.labels_lookup, dst=labels)
+            else:
+                chunk_labels = self._chunk_labels_buffer[:labels.size].reshape(labels.shape)
+                cv2.LUT(word, chunk.labels_lookup, dst=chunk_labels)
+                np.copyto(labels, chunk_labels, where=word > 0)
+
+        out[...] = labels[:, :width]
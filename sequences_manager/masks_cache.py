@@ -0,0 +1,177 @@
+import hashlib
+import json
+import logging
+import os
+import struct
+from pathlib import Path
+
+import numpy as np
+
+from sequences_manager.sequence_layer import SequenceLayer
+
+# File layout: magic | version (u32) | header length (u32) | JSON header | aligned raw blobs
+# (static masks as shaded images, dynamic masks as bit-packed frame stacks with their frames bounding boxes).
+# Blob offsets in the header are relative to the first aligned byte after it, so the file can be memory-mapped and sliced.
+MASKS_CACHE_MAGIC = b'TMPLMASK'
+MASKS_CACHE_VERSION = 3
+
+_PREAMBLE = struct.Struct('<8sII')
+_ALIGNMENT = 64
+
+
+class MasksCache:
+    def __init__(self, cache_path: str):
+        self._cache_path = Path(cache_path)
+        self.logger = logging.getLogger()
+
+    def get_cache_file_path(self, sequence_name: str) -> Path:
+        return self._cache_path / f'{sequence_name}.masks'
+
+    @staticmethod
+    def list_source_files(sequence_config: dict, data_path_root: str, sequence_name: str) -> list[Path]:
+        sources = []
+
+        for static_mask_id in sequence_config['static_masks'].keys():
+            sources.append(Path(f'{data_path_root}/{sequence_name}_{static_mask_id}.png'))
+
+        for dynamic_mask_id in sequence_config['sequence_masks'].keys():
+            columns_files = SequenceLayer.list_dynamic_files(f'{data_path_root}/{sequence_name}_{dynamic_mask_id}')
+            for column_index in sorted(columns_files.keys()):
+                sources.extend(columns_files[column_index])
+
+        return sources
+
+    @staticmethod
+    def build_key(sequence_config: dict, data_path_root: str, sequence_name: str,
+                  content_size: (int, int), max_counter_value: int) -> str:
+        sources = MasksCache.list_source_files(sequence_config, data_path_root, sequence_name)
+
+        key_data = {
+            'version': MASKS_CACHE_VERSION,
+            'content_size': list(content_size),
+            'max_counter_value': max_counter_value,
+            'static_masks': sequence_config['static_masks'],
+            'sequence_masks': sequence_config['sequence_masks'],
+            'sources': [
+                (str(source), source.stat().st_mtime_ns, source.stat().st_size)
+                for source in sources
+            ]
+        }
+
+        return hashlib.sha1(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+
+    def load(self, sequence_name: str, key: str, content_size: (int, int)) -> dict[int, SequenceLayer] | None:
+        cache_file_path = self.get_cache_file_path(sequence_name)
+
+        if not cache_file_path.is_file():
+            return None
+
+        try:
+            header = self._read_header(cache_file_path)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f'Ignoring unreadable masks cache {cache_file_path}: {e}')
+            return None
+
+        if header is None or header['key'] != key:
+            return None
+
+        data = np.memmap(cache_file_path, dtype=np.uint8, mode='r')
+        data_start = header['data_start']
+
+        def view(blob):
+            offset, shape, dtype = data_start + blob['offset'], tuple(blob['shape']), np.dtype(blob['dtype'])
+            return data[offset:offset + int(np.prod(shape)) * dtype.itemsize].view(dtype).reshape(shape)
+
+        layers = {}
+
+        for layer_info in header['layers']:
+            if layer_info['static'] is not None:
+                layers[layer_info['id']] = SequenceLayer.from_masks(
+                    layer_info['gray_shade'],
+                    content_size,
+                    static_mask_image=view(layer_info['static'])
+                )
+            else:
+                layers[layer_info['id']] = SequenceLayer.from_masks(
+                    layer_info['gray_shade'],
+                    content_size,
+                    packed_dynamic_masks={
+                        int(column_index): view(blobs['frames'])
+                        for column_index, blobs in layer_info['dynamic'].items()
+                    },
+                    frames_regions={
+                        int(column_index): view(blobs['regions'])
+                        for column_index, blobs in layer_info['dynamic'].items()
+                    }
+                )
+
+        return layers
+
+    def save(self, sequence_name: str, key: str, layers: dict[int, SequenceLayer]):
+        blobs = []
+        offset = 0
+
+        def add_blob(array):
+            nonlocal offset
+            blob = np.ascontiguousarray(array)
+            blobs.append((offset, blob))
+            blob_info = {'offset': offset, 'shape': list(blob.shape), 'dtype': blob.dtype.str}
+            offset = self._align(offset + blob.nbytes)
+            return blob_info
+
+        layers_info = []
+
+        for layer_id, layer in layers.items():
+            if layer.static_mask_image is not None:
+                static_info, dynamic_info = add_blob(layer.static_mask_image), None
+            else:
+                static_info, dynamic_info = None, {
+                    str(column_index): {
+                        'frames': add_blob(packed_frames),
+                        'regions': add_blob(layer.frames_regions[column_index])
+                    }
+                    for column_index, packed_frames in layer.packed_dynamic_masks.items()
+                }
+
+            layers_info.append({
+                'id': layer_id,
+                'gray_shade': int(layer.gray_shade),
+                'static': static_info,
+                'dynamic': dynamic_info
+            })
+
+        header = json.dumps({'key': key, 'layers': layers_info}).encode()
+        data_start = self._align(_PREAMBLE.size + len(header))
+
+        cache_file_path = self.get_cache_file_path(sequence_name)
+        cache_file_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_file_path = cache_file_path.with_suffix('.tmp')
+
+        with open(temporary_file_path, 'wb') as f:
+            f.write(_PREAMBLE.pack(MASKS_CACHE_MAGIC, MASKS_CACHE_VERSION, len(header)))
+            f.write(header)
+            for blob_offset, blob in blobs:
+                f.seek(data_start + blob_offset)
+                f.write(blob.tobytes())
+
+        os.replace(temporary_file_path, cache_file_path)
+
+    @staticmethod
+    def _read_header(cache_file_path: Path) -> dict | None:
+        with open(cache_file_path, 'rb') as f:
+            magic, version, header_length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+
+            if magic != MASKS_CACHE_MAGIC:
+                raise ValueError('not a masks cache file')
+
+            if version != MASKS_CACHE_VERSION:
+                return None
+
+            header = json.loads(f.read(header_length))
+            header['data_start'] = MasksCache._align(_PREAMBLE.size + header_length)
+
+            return header
+
+    @staticmethod
+    def _align(offset: int) -> int:
+        return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
@@ -0,0 +1,66 @@
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+import numpy.typing as npt
+
+
+class MasksMemo:
+    def __init__(self, max_bytes: int, compression_level: int = 1):
+        self._max_bytes = max_bytes
+        self._compression_level = compression_level
+
+        self._entries: OrderedDict[tuple, tuple[bytes, tuple[int, ...]]] = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: tuple) -> npt.NDArray[np.uint8] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        compressed_image, shape = entry
+        return np.frombuffer(zlib.decompress(compressed_image), dtype=np.uint8).reshape(shape).copy()
+
+    def put(self, key: tuple, image: npt.NDArray[np.uint8]):
+        compressed_image = zlib.compress(np.ascontiguousarray(image).tobytes(), self._compression_level)
+
+        if len(compressed_image) > self._max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._size_bytes -= len(self._entries.pop(key)[0])
+
+            self._entries[key] = (compressed_image, image.shape)
+            self._size_bytes += len(compressed_image)
+
+            while self._size_bytes > self._max_bytes:
+                _, (evicted_image, _) = self._entries.popitem(last=False)
+                self._size_bytes -= len(evicted_image)
+                self.evictions += 1
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+
+            return {
+                'entries': len(self._entries),
+                'size_bytes': self._size_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups > 0 else 0.0
+            }
@@ -0,0 +1,59 @@
+import numpy as np
+import numpy.typing as npt
+
+# Row i holds the 8 pixels encoded by byte value i (most significant bit first, as in np.packbits).
+_BITS_TABLE = np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1)
+
+
+def pack_mask(mask_image: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
+    return np.packbits(mask_image > 0, axis=-1)
+
+
+def build_unpack_table(gray_shade: int) -> npt.NDArray[np.uint8]:
+    return _BITS_TABLE * np.uint8(gray_shade)
+
+
+def unpack_mask(packed_mask: npt.NDArray[np.uint8], unpack_table: npt.NDArray[np.uint8], width: int,
+                out: npt.NDArray[np.uint8] | None = None) -> npt.NDArray[np.uint8]:
+    height, packed_width = packed_mask.shape
+
+    if out is not None and width == packed_width * 8 and out.flags.c_contiguous:
+        np.take(unpack_table, packed_mask, axis=0, out=out.reshape(height, packed_width, 8), mode='clip')
+        return out
+
+    unpacked = np.take(unpack_table, packed_mask, axis=0).reshape(height, packed_width * 8)[:, :width]
+
+    if out is not None:
+        out[...] = unpacked
+        return out
+
+    return unpacked
+
+
+def get_packed_frames_regions(packed_frames: npt.NDArray[np.uint8], width: int) -> npt.NDArray[np.int32]:
+    frames_count, height, packed_width = packed_frames.shape
+
+    rows = packed_frames.any(axis=2)
+    packed_columns = packed_frames.any(axis=1)
+    not_empty = rows.any(axis=1)
+
+    regions = np.zeros((frames_count, 4), dtype=np.int32)
+    regions[:, 0] = np.argmax(rows, axis=1)
+    regions[:, 1] = height - np.argmax(rows[:, ::-1], axis=1)
+    regions[:, 2] = np.argmax(packed_columns, axis=1) * 8
+    regions[:, 3] = np.minimum((packed_width - np.argmax(packed_columns[:, ::-1], axis=1)) * 8, width)
+    regions[~not_empty] = 0
+
+    return regions
+
+
+def merge_regions(regions: npt.NDArray[np.int32]) -> tuple[int, int, int, int] | None:
+    regions = regions[(regions[:, 1] > regions[:, 0]) & (regions[:, 3] > regions[:, 2])]
+
+    if len(regions) == 0:
+        return None
+
+    return (
+        int(regions[:, 0].min()), int(regions[:, 1].max()),
+        int(regions[:, 2].min()), int(regions[:, 3].max())
+    )
@@ -0,0 +1,71 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from sequences_manager.packed_mask import pack_mask
+from sequences_manager.sequence_layer import SequenceLayer
+
+
+def _decode_column_frames(frames_files: list[str], gray_shade: int, target_size: (int, int),
+                          shared_memory_name: str, shape: tuple[int, int, int]):
+    # runs in a worker process, decoded frames are written straight into the parent's shared memory block
+    column_memory = shared_memory.SharedMemory(name=shared_memory_name, track=False)
+
+    try:
+        packed_frames = np.ndarray(shape, dtype=np.uint8, buffer=column_memory.buf)
+
+        for frame_index, frame_file in enumerate(frames_files):
+            packed_frames[frame_index] = pack_mask(SequenceLayer.load_image(frame_file, gray_shade, target_size))
+
+        del packed_frames
+    finally:
+        column_memory.close()
+
+
+class ProcessMasksDecoder:
+    def __init__(self, processes_count: int):
+        # spawned workers do not inherit the threads and device handles of the application process
+        self._executor = ProcessPoolExecutor(processes_count, mp_context=multiprocessing.get_context('spawn'))
+
+    def decode_dynamic_layers(self, layers_files: dict[int, tuple[int, str]], target_size: (int, int),
+                              max_counter_value: int) -> dict[int, SequenceLayer]:
+        width, height = target_size
+        shape = (max_counter_value + 1, height, (width + 7) // 8)
+
+        tasks = []
+
+        try:
+            for layer_id, (gray_shade, dynamic_files_path) in layers_files.items():
+                for column_index, frames_files in SequenceLayer.list_dynamic_files(dynamic_files_path).items():
+                    assert len(frames_files) == max_counter_value + 1, f'wrong frames files count in {frames_files[0].parent}'
+
+                    column_memory = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+                    future = self._executor.submit(
+                        _decode_column_frames,
+                        [str(frame_file) for frame_file in frames_files],
+                        gray_shade, target_size, column_memory.name, shape
+                    )
+                    tasks.append((layer_id, column_index, column_memory, future))
+
+            packed_dynamic_masks = {layer_id: {} for layer_id in layers_files.keys()}
+
+            for layer_id, column_index, column_memory, future in tasks:
+                future.result()
+                packed_dynamic_masks[layer_id][column_index] = np.ndarray(
+                    shape, dtype=np.uint8, buffer=column_memory.buf
+                ).copy()
+        finally:
+            for _, _, column_memory, future in tasks:
+                future.cancel()
+                column_memory.close()
+                column_memory.unlink()
+
+        return {
+            layer_id: SequenceLayer.from_masks(gray_shade, target_size, packed_dynamic_masks=packed_dynamic_masks[layer_id])
+            for layer_id, (gray_shade, _) in layers_files.items()
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(cancel_futures=True)
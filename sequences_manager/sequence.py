@@ -1,7 +1,13 @@
 import numpy as np
 import numpy.typing as npt
 import logging
+import threading
+import time
 
+from sequences_manager.mask_compositor import MaskCompositor
+from sequences_manager.masks_cache import MasksCache
+from sequences_manager.packed_mask import merge_regions
+from sequences_manager.process_masks_decoder import ProcessMasksDecoder
 from sequences_manager.sequence_layer import SequenceLayer
 from sequences_manager.sequence_overlay import SequenceOverlay
 
@@ -17,31 +23,67 @@ class Sequence:
         self._content_size = content_size
         self._output_size = output_size
         self._layers = []
+        self._compositor: MaskCompositor | None = None
         self._overlay: SequenceOverlay | None = None
         self._max_counter_value = max_counter_value
+        self._composed_image: npt.NDArray[np.uint8] | None = None
+        self._composed_counters: npt.NDArray[np.uint8] | None = None
+        self._loaded = False
+        self._loading_lock = threading.Lock()
+        # composition keeps incremental state, frames may be requested from speculative generation too
+        self._composing_lock = threading.Lock()
         self.logger = logging.getLogger()
 
-    def load_data(self, files_path: str, overlay_files_path: str):
+    @property
+    def config(self) -> dict:
+        return self._config
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    def load_data(self, files_path: str, overlay_files_path: str, masks_cache: MasksCache | None = None,
+                  masks_decoder: ProcessMasksDecoder | None = None):
+        with self._loading_lock:
+            if self._loaded:
+                return
+
+            self._load_data(files_path, overlay_files_path, masks_cache, masks_decoder)
+            self._loaded = True
+
+    def unload_data(self):
+        with self._loading_lock, self._composing_lock:
+            self._layers = []
+            self._compositor = None
+            self._overlay = None
+            self._composed_image = None
+            self._composed_counters = None
+            self._loaded = False
+
+    def _load_data(self, files_path: str, overlay_files_path: str, masks_cache: MasksCache | None,
+                   masks_decoder: ProcessMasksDecoder | None):
         data_path_root = f'{files_path}/{self.name}'
 
-        layers_dict = {}
+        layers_dict = None
+        cache_key = None
 
-        for static_mask_id, static_mask_gray_shade in self._config['static_masks'].items():
-            layers_dict[int(static_mask_id)] = SequenceLayer(
-                static_mask_gray_shade,
-                self._content_size,
-                static_file_path=f'{data_path_root}/{self.name}_{static_mask_id}.png'
+        if masks_cache is not None:
+            cache_key = MasksCache.build_key(
+                self._config, data_path_root, self.name, self._content_size, self._max_counter_value
             )
+            layers_dict = masks_cache.load(self.name, cache_key, self._content_size)
 
-        for dynamic_mask_id, dynamic_mask_gray_shade in self._config['sequence_masks'].items():
-            layers_dict[int(dynamic_mask_id)] = SequenceLayer(
-                dynamic_mask_gray_shade,
-                self._content_size,
-                dynamic_files_path=f'{data_path_root}/{self.name}_{dynamic_mask_id}',
-                max_counter_value=self._max_counter_value
-            )
+            if layers_dict is not None:
+                self.logger.info(f'Sequence {self.name} loaded from masks cache')
+
+        if layers_dict is None:
+            layers_dict = self.decode_layers(data_path_root, masks_decoder)
+
+            if masks_cache is not None:
+                masks_cache.save(self.name, cache_key, layers_dict)
 
         self._layers = [layers_dict[key] for key in sorted(layers_dict.keys(), reverse=True)]
+        self._compositor = MaskCompositor(list(reversed(self._layers)), self._content_size)
 
         if 'overlay' in self._config:
             self._overlay = SequenceOverlay(
@@ -54,15 +96,100 @@ class Sequence:
         else:
             self._overlay = SequenceOverlay(self._output_size)
 
+    def decode_layers(self, data_path_root: str,
+                      masks_decoder: ProcessMasksDecoder | None = None) -> dict[int, SequenceLayer]:
+        start_time = time.time()
+
+        layers_dict = {}
+
+        for static_mask_id, static_mask_gray_shade in self._config['static_masks'].items():
+            layers_dict[int(static_mask_id)] = SequenceLayer(
+                static_mask_gray_shade,
+                self._content_size,
+                static_file_path=f'{data_path_root}/{self.name}_{static_mask_id}.png'
+            )
+
+        if masks_decoder is not None:
+            layers_dict.update(masks_decoder.decode_dynamic_layers(
+                {
+                    int(dynamic_mask_id): (dynamic_mask_gray_shade, f'{data_path_root}/{self.name}_{dynamic_mask_id}')
+                    for dynamic_mask_id, dynamic_mask_gray_shade in self._config['sequence_masks'].items()
+                },
+                self._content_size,
+                self._max_counter_value
+            ))
+        else:
+            for dynamic_mask_id, dynamic_mask_gray_shade in self._config['sequence_masks'].items():
+                layers_dict[int(dynamic_mask_id)] = SequenceLayer(
+                    dynamic_mask_gray_shade,
+                    self._content_size,
+                    dynamic_files_path=f'{data_path_root}/{self.name}_{dynamic_mask_id}',
+                    max_counter_value=self._max_counter_value
+                )
+
+        elapsed = max(time.time() - start_time, 1e-6)
+        source_files = MasksCache.list_source_files(self._config, data_path_root, self.name)
+        source_megabytes = sum(source_file.stat().st_size for source_file in source_files) / 1e6
+
+        self.logger.info(
+            f'Sequence {self.name} decoded {len(source_files)} frames ({source_megabytes:.1f} MB) in {elapsed:.2f}s: '
+            f'{len(source_files) / elapsed:.1f} frames/s, {source_megabytes / elapsed:.1f} MB/s'
+        )
+
+        return layers_dict
+
     def build_image(self, counters: npt.NDArray[np.uint8])-> npt.NDArray[np.uint8]:
-        width, height = self._content_size
-        result = np.zeros((height, width), dtype=np.uint8)
+        with self._composing_lock:
+            if self._composed_image is None:
+                width, height = self._content_size
+                self._composed_image = np.zeros((height, width), dtype=np.uint8)
+                self._compose_region(counters, (0, height, 0, width))
+            else:
+                for region in self._get_changed_regions(counters):
+                    self._compose_region(counters, region)
+
+            self._composed_counters = np.array(counters, copy=True)
+
+            return self._composed_image.copy()
+
+    def get_state_key(self, counters: npt.NDArray[np.uint8]) -> tuple[int, ...]:
+        # only counters of columns driving any dynamic layer change the composed image
+        columns = sorted({column_index for layer in self._layers for column_index in layer.dynamic_columns})
+        return tuple(int(counters[column_index]) for column_index in columns)
+
+    def get_column_footprint(self, column_index: int) -> tuple[int, int, int, int] | None:
+        footprints = [
+            footprint
+            for footprint in (layer.get_column_footprint(column_index) for layer in self._layers)
+            if footprint is not None
+        ]
+
+        if len(footprints) == 0:
+            return None
+
+        return merge_regions(np.array(footprints, dtype=np.int32))
+
+    def _get_changed_regions(self, counters: npt.NDArray[np.uint8]) -> list[tuple[int, int, int, int]]:
+        changed_columns = np.flatnonzero(counters != self._composed_counters)
+
+        regions = []
 
         for layer in self._layers:
-            layer_image = layer.build_layer_image(counters)
-            result = np.where(layer_image > 0, layer_image, result)
+            for column_index in layer.dynamic_columns:
+                if column_index not in changed_columns:
+                    continue
+
+                region = layer.get_changed_region(
+                    column_index, self._composed_counters[column_index], counters[column_index]
+                )
+                if region is not None:
+                    regions.append(region)
+
+        return regions
 
-        return result
+    def _compose_region(self, counters: npt.NDArray[np.uint8], region: tuple[int, int, int, int]):
+        y_start, y_end, x_start, x_end = region
+        self._compositor.compose(counters, region, self._composed_image[y_start:y_end, x_start:x_end])
 
     def update_overlay(self, counters: npt.NDArray[np.uint8])-> npt.NDArray[np.uint8]:
         counters = counters[:9]
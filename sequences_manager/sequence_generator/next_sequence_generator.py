@@ -1,5 +1,6 @@
 import json
 from abc import abstractmethod, ABC
+from collections import deque
 
 from config.modules_configs.sequence_config import SequenceConfig
 
@@ -8,11 +9,24 @@ class NextSequenceGenerator(ABC):
     def __init__(self, config: SequenceConfig) -> None:
         self._current_path_item = -1
         self._current_path = []
+        self._upcoming_sequences = deque()
 
         with open(config.sequence_mapping_path, 'r') as file:
             self._sequence_mapping = json.load(file)
 
     def next_sequence(self) -> str:
+        if len(self._upcoming_sequences) > 0:
+            return self._upcoming_sequences.popleft()
+
+        return self._advance()
+
+    def peek_next_sequences(self, count: int) -> list[str]:
+        while len(self._upcoming_sequences) < count:
+            self._upcoming_sequences.append(self._advance())
+
+        return list(self._upcoming_sequences)[:count]
+
+    def _advance(self) -> str:
         self._current_path_item += 1
 
         if self._current_path_item >= len(self._current_path):
@@ -4,6 +4,9 @@ import cv2
 import numpy as np
 import numpy.typing as npt
 
+from sequences_manager.packed_mask import pack_mask, build_unpack_table, unpack_mask, get_packed_frames_regions, \
+    merge_regions
+
 class SequenceLayer:
     def __init__(self, gray_shade: int, target_size: (int, int),
                  dynamic_files_path: str = None, static_file_path: str = None,
@@ -11,54 +14,153 @@ class SequenceLayer:
                 ):
         assert dynamic_files_path is not None or static_file_path is not None, 'either files_path or static_file_path should be defined'
 
+        self.gray_shade = gray_shade
         self._static_mask_image = None
-        self._dynamic_mask_images = {}
+        self._packed_dynamic_masks = {}
+        self._frames_regions = {}
         self._target_size = target_size
+        self._unpack_table = build_unpack_table(gray_shade)
 
         if static_file_path is not None:
-            self._static_mask_image = self._load_image(static_file_path, gray_shade, target_size)
+            self._static_mask_image = self.load_image(static_file_path, gray_shade, target_size)
+        self._packed_static_mask = pack_mask(self._static_mask_image) if self._static_mask_image is not None else None
 
         if dynamic_files_path is not None:
-            path = Path(dynamic_files_path)
+            for column_index, frames_files in self.list_dynamic_files(dynamic_files_path).items():
+                assert len(frames_files) == max_counter_value + 1, f'wrong frames files count in {frames_files[0].parent}'
 
-            columns_directories = [
-                d
-                for d in path.iterdir()
-                if d.is_dir() and not d.name.startswith('.')
-            ]
+                self._packed_dynamic_masks[column_index] = np.stack([
+                    pack_mask(self.load_image(frame_file, gray_shade, target_size))
+                    for frame_file in frames_files
+                ])
+                self._frames_regions[column_index] = get_packed_frames_regions(
+                    self._packed_dynamic_masks[column_index], target_size[0]
+                )
 
-            for column_directory in columns_directories:
-                column_index = int(column_directory.stem.split('_')[-1])
-                self._dynamic_mask_images[column_index] = []
+    @classmethod
+    def from_masks(cls, gray_shade: int, target_size: (int, int),
+                   static_mask_image: npt.NDArray[np.uint8] = None,
+                   packed_dynamic_masks: dict[int, npt.NDArray[np.uint8]] = None,
+                   frames_regions: dict[int, npt.NDArray[np.int32]] = None) -> 'SequenceLayer':
+        assert packed_dynamic_masks is not None or static_mask_image is not None, 'either packed_dynamic_masks or static_mask_image should be defined'
 
-                frames_files = sorted([
-                    file_path
-                    for file_path in column_directory.iterdir()
-                    if file_path.is_file() and not file_path.name.startswith('.')
-                ])
+        layer = cls.__new__(cls)
+        layer.gray_shade = gray_shade
+        layer._static_mask_image = static_mask_image
+        layer._packed_static_mask = pack_mask(static_mask_image) if static_mask_image is not None else None
+        layer._packed_dynamic_masks = packed_dynamic_masks if packed_dynamic_masks is not None else {}
+        layer._target_size = target_size
+        layer._unpack_table = build_unpack_table(gray_shade)
 
-                assert len(frames_files) == max_counter_value + 1, f'wrong frames files count in {column_directory}'
+        if frames_regions is None:
+            frames_regions = {
+                column_index: get_packed_frames_regions(packed_frames, target_size[0])
+                for column_index, packed_frames in layer._packed_dynamic_masks.items()
+            }
+        layer._frames_regions = frames_regions
 
-                for frame_file in frames_files:
-                    frame_mask = self._load_image(frame_file, gray_shade, target_size)
-                    self._dynamic_mask_images[column_index].append(frame_mask)
+        return layer
 
     @staticmethod
-    def _load_image(image_path: str, gray_shade: int, target_size: (int, int)) -> npt.NDArray[np.uint8]:
-        mask_image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    def list_dynamic_files(dynamic_files_path: str) -> dict[int, list[Path]]:
+        path = Path(dynamic_files_path)
+
+        columns_directories = [
+            d
+            for d in path.iterdir()
+            if d.is_dir() and not d.name.startswith('.')
+        ]
+
+        columns_files = {}
+
+        for column_directory in columns_directories:
+            column_index = int(column_directory.stem.split('_')[-1])
+
+            columns_files[column_index] = sorted([
+                file_path
+                for file_path in column_directory.iterdir()
+                if file_path.is_file() and not file_path.name.startswith('.')
+            ])
+
+        return columns_files
+
+    @staticmethod
+    def load_image(image_path: str, gray_shade: int, target_size: (int, int)) -> npt.NDArray[np.uint8]:
+        mask_image = cv2.imread(str(image_path), cv2.IMREAD_GRAYSCALE)
         _, mask_image = cv2.threshold(mask_image, 127, 255, cv2.THRESH_BINARY)
         mask_image[mask_image == 255] = gray_shade
         mask_image = cv2.resize(mask_image, target_size, interpolation=cv2.INTER_NEAREST)
         return mask_image
 
-    def build_layer_image(self, counters: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
+    @property
+    def static_mask_image(self) -> npt.NDArray[np.uint8] | None:
+        return self._static_mask_image
+
+    @property
+    def packed_dynamic_masks(self) -> dict[int, npt.NDArray[np.uint8]]:
+        return self._packed_dynamic_masks
+
+    @property
+    def frames_regions(self) -> dict[int, npt.NDArray[np.int32]]:
+        return self._frames_regions
+
+    @property
+    def dynamic_columns(self) -> list[int]:
+        return list(self._packed_dynamic_masks.keys())
+
+    def get_column_footprint(self, column_index: int) -> tuple[int, int, int, int] | None:
+        if column_index not in self._frames_regions:
+            return None
+
+        return merge_regions(self._frames_regions[column_index])
+
+    def get_changed_region(self, column_index: int, previous_counter: int, counter: int) -> tuple[int, int, int, int] | None:
+        if column_index not in self._frames_regions or previous_counter == counter:
+            return None
+
+        return merge_regions(self._frames_regions[column_index][[previous_counter, counter]])
+
+    def build_layer_image(self, counters: npt.NDArray[np.uint8],
+                          region: tuple[int, int, int, int] = None) -> npt.NDArray[np.uint8]:
+        width, height = self._target_size
+        y_start, y_end, x_start, x_end = region if region is not None else (0, height, 0, width)
+
         if self._static_mask_image is not None:
-            return self._static_mask_image
+            return self._static_mask_image[y_start:y_end, x_start:x_end]
+
+        return unpack_mask(self.build_packed_layer(counters, region), self._unpack_table, x_end - x_start)
 
+    def build_packed_layer(self, counters: npt.NDArray[np.uint8], region: tuple[int, int, int, int] = None,
+                           out: npt.NDArray[np.uint8] | None = None) -> npt.NDArray[np.uint8]:
         width, height = self._target_size
-        result = np.zeros((height, width), dtype=np.uint8)
+        y_start, y_end, x_start, x_end = region if region is not None else (0, height, 0, width)
 
-        for column_index, frames_images in self._dynamic_mask_images.items():
-            result = cv2.bitwise_or(result, frames_images[counters[column_index]])
+        # x_start is always aligned to a packed byte boundary
+        packed_x_start, packed_x_end = x_start // 8, (x_end + 7) // 8
+
+        if self._packed_static_mask is not None:
+            return self._packed_static_mask[y_start:y_end, packed_x_start:packed_x_end]
+
+        if out is None:
+            packed_result = np.zeros((y_end - y_start, packed_x_end - packed_x_start), dtype=np.uint8)
+        else:
+            packed_result = out
+            packed_result.fill(0)
+
+        for column_index, packed_frames in self._packed_dynamic_masks.items():
+            counter = counters[column_index]
+            frame_y_start, frame_y_end, frame_x_start, frame_x_end = self._frames_regions[column_index][counter]
+
+            frame_y_start, frame_y_end = max(frame_y_start, y_start), min(frame_y_end, y_end)
+            frame_x_start, frame_x_end = max(frame_x_start // 8, packed_x_start), min((frame_x_end + 7) // 8, packed_x_end)
+
+            if frame_y_start >= frame_y_end or frame_x_start >= frame_x_end:
+                continue
+
+            target = packed_result[
+                frame_y_start - y_start:frame_y_end - y_start,
+                frame_x_start - packed_x_start:frame_x_end - packed_x_start
+            ]
+            np.bitwise_or(target, packed_frames[counter, frame_y_start:frame_y_end, frame_x_start:frame_x_end], out=target)
 
-        return result
+        return packed_result
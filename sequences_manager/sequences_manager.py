@@ -1,16 +1,20 @@
 import json
 import logging
 import threading
+from collections import OrderedDict
 from enum import Enum
 from multiprocessing import cpu_count
 
 import numpy as np
 import numpy.typing as npt
-from reactivex import create, from_, Observable, of
+from reactivex import create, from_, Observable, of, Subject
 from reactivex.scheduler import ThreadPoolScheduler
 import reactivex.operators as ops
 
 from config.integrated_config import IntegratedConfig
+from sequences_manager.masks_cache import MasksCache
+from sequences_manager.masks_memo import MasksMemo
+from sequences_manager.process_masks_decoder import ProcessMasksDecoder
 from sequences_manager.sequence import Sequence
 from sequences_manager.sequence_generator.random_paths_generator.random_sequence_generator import \
     RandomSequenceGenerator
@@ -20,6 +24,7 @@ from sequences_manager.sequence_generator.static_paths_generator.static_paths_ge
 class SequenceStatus(Enum):
     LOADING = 1
     READY = 2
+    UNLOADED = 3
 
 class SequencesManager:
     def __init__(self, config: IntegratedConfig):
@@ -33,9 +38,26 @@ class SequencesManager:
         else:
             self._next_sequence_generator = RandomSequenceGenerator(config.sequence)
 
+        self._masks_cache = MasksCache(config.sequence.masks_cache_path) if config.sequence.use_masks_cache else None
+
+        self._masks_memo = MasksMemo(config.sequence.masks_memo_max_bytes) if config.sequence.masks_memo_max_bytes > 0 else None
+
+        self._masks_decoder: ProcessMasksDecoder | None = None
+        if config.sequence.masks_decoding_mode == 'processes':
+            self._masks_decoder = ProcessMasksDecoder(config.sequence.masks_decoding_processes or cpu_count())
+
         self._sequences: dict[str, Sequence] = {}
         self._current_sequence: str | None = None
 
+        self._lazy_loading = config.sequence.lazy_loading
+        self._loading_scheduler: ThreadPoolScheduler | None = None
+        self._resident_sequences: OrderedDict[str, None] = OrderedDict()
+        self._upcoming_sequences: list[str] = []
+        self._residency_lock = threading.Lock()
+
+        # status changes of lazily loaded sequences after the initial load_masks_data stream has completed
+        self.sequences_status = Subject()
+
     def load_masks_data(self) -> Observable:
         def sequence_loader_observable(observer, _):
             try:
@@ -47,7 +69,10 @@ class SequencesManager:
 
             self._sequences = {}
 
-            loading_scheduler = ThreadPoolScheduler(cpu_count())
+            self._loading_scheduler = ThreadPoolScheduler(cpu_count())
+
+            if self._lazy_loading:
+                return self._register_lazy_sequences(sequences_config, observer)
 
             return from_(sequences_config.items()).pipe(
                 ops.map(lambda item: { 'sequence_name': item[0], 'sequence_config': item[1] }),
@@ -57,21 +82,17 @@ class SequencesManager:
                 })),
                 ops.map(lambda sequence_info: {
                     'sequence_info': sequence_info,
-                    'sequence': Sequence(
-                        sequence_info['sequence_name'],
-                        sequence_info['sequence_config'],
-                        self.config.spade.content_resolution,
-                        self.config.spade.output_resolution,
-                        self.config.timing.max_counter_value
-                    )
+                    'sequence': self._create_sequence(sequence_info['sequence_name'], sequence_info['sequence_config'])
                 }),
                 ops.do_action(lambda sequence_data: self._sequences.update({sequence_data['sequence'].name: sequence_data['sequence']})),
                 ops.flat_map( # ensures concurrency
                     lambda sequence_data: of(sequence_data).pipe(
-                        ops.observe_on(loading_scheduler),
+                        ops.observe_on(self._loading_scheduler),
                         ops.do_action(lambda sequence_data: sequence_data['sequence'].load_data(
                             self.config.sequence.images_path,
-                            self.config.sequence.overlays_images_path
+                            self.config.sequence.overlays_images_path,
+                            self._masks_cache,
+                            self._masks_decoder
                         )),
                         ops.do_action(lambda sequence_data: observer.on_next({
                             **sequence_data['sequence_info'],
@@ -86,11 +107,122 @@ class SequencesManager:
 
         return create(sequence_loader_observable)
 
+    def _register_lazy_sequences(self, sequences_config: dict, observer):
+        for sequence_name, sequence_config in sequences_config.items():
+            self._sequences[sequence_name] = self._create_sequence(sequence_name, sequence_config)
+            observer.on_next({
+                'sequence_name': sequence_name,
+                'sequence_config': sequence_config,
+                'status': SequenceStatus.UNLOADED
+            })
+
+        self._upcoming_sequences = self._next_sequence_generator.peek_next_sequences(
+            1 + self.config.sequence.prefetch_sequences_count
+        )
+
+        return from_(self._upcoming_sequences).pipe(
+            ops.flat_map(
+                lambda sequence_name: of(sequence_name).pipe(
+                    ops.observe_on(self._loading_scheduler),
+                    ops.do_action(lambda sequence_name: self._load_sequence(sequence_name, observer.on_next))
+                )
+            )
+        ).subscribe(
+            on_error=observer.on_error,
+            on_completed=observer.on_completed
+        )
+
+    def _create_sequence(self, sequence_name: str, sequence_config: dict) -> Sequence:
+        return Sequence(
+            sequence_name,
+            sequence_config,
+            self.config.spade.content_resolution,
+            self.config.spade.output_resolution,
+            self.config.timing.max_counter_value
+        )
+
+    def _load_sequence(self, sequence_name: str, on_status=None):
+        on_status = on_status if on_status is not None else self.sequences_status.on_next
+        sequence = self._sequences[sequence_name]
+
+        if not sequence.is_loaded:
+            on_status({
+                'sequence_name': sequence_name,
+                'sequence_config': sequence.config,
+                'status': SequenceStatus.LOADING
+            })
+
+            sequence.load_data(
+                self.config.sequence.images_path,
+                self.config.sequence.overlays_images_path,
+                self._masks_cache,
+                self._masks_decoder
+            )
+
+            on_status({
+                'sequence_name': sequence_name,
+                'sequence_config': sequence.config,
+                'status': SequenceStatus.READY
+            })
+
+        with self._residency_lock:
+            self._resident_sequences[sequence_name] = None
+            self._resident_sequences.move_to_end(sequence_name)
+
+        self._evict_sequences()
+
+    def _evict_sequences(self):
+        with self._residency_lock:
+            protected_sequences = {self._current_sequence, *self._upcoming_sequences}
+            evicted_sequences = []
+
+            for sequence_name in list(self._resident_sequences.keys()):
+                if len(self._resident_sequences) <= self.config.sequence.max_resident_sequences:
+                    break
+
+                if sequence_name in protected_sequences:
+                    continue
+
+                del self._resident_sequences[sequence_name]
+                evicted_sequences.append(sequence_name)
+
+        for sequence_name in evicted_sequences:
+            sequence = self._sequences[sequence_name]
+            sequence.unload_data()
+            self.logger.info(f'Sequence {sequence_name} unloaded')
+
+            self.sequences_status.on_next({
+                'sequence_name': sequence_name,
+                'sequence_config': sequence.config,
+                'status': SequenceStatus.UNLOADED
+            })
+
+    def _prefetch_upcoming_sequences(self):
+        self._upcoming_sequences = self._next_sequence_generator.peek_next_sequences(
+            self.config.sequence.prefetch_sequences_count
+        )
+
+        for sequence_name in self._upcoming_sequences:
+            if not self._sequences[sequence_name].is_loaded:
+                self._loading_scheduler.schedule(lambda _, __, name=sequence_name: self._load_sequence(name))
+
     def get_sequence_image(self, counters: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
         if self._current_sequence is None:
             self.switch_sequence()
 
-        return self._sequences[self._current_sequence].build_image(counters)
+        sequence = self._sequences[self._current_sequence]
+
+        if self._masks_memo is None:
+            return sequence.build_image(counters)
+
+        state_key = (sequence.name, sequence.get_state_key(counters))
+
+        image = self._masks_memo.get(state_key)
+        if image is None:
+            image = sequence.build_image(counters)
+            self._masks_memo.put(state_key, image)
+
+        return image
 
     def update_sequence_overlay(self, counters: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
         return self._sequences[self._current_sequence].update_overlay(counters)
@@ -101,7 +233,23 @@ class SequencesManager:
         if self._current_sequence is not None:
             self._sequences[self._current_sequence].reset_overlay()
 
+        if self._masks_memo is not None:
+            memo_stats = self._masks_memo.stats
+            self.logger.info(
+                f'Masks memo: {memo_stats["entries"]} entries, {memo_stats["size_bytes"] / 1e6:.1f} MB, '
+                f'{memo_stats["hits"]} hits, {memo_stats["misses"]} misses ({memo_stats["hit_rate"]:.1%}), '
+                f'{memo_stats["evictions"]} evictions'
+            )
+
         self._current_sequence = self._next_sequence_generator.next_sequence()
 
+        if self._lazy_loading:
+            self._load_sequence(self._current_sequence)
+            self._prefetch_upcoming_sequences()
+
     def get_current_sequence_name(self):
         return self._current_sequence
+
+    def cleanup(self):
+        if self._masks_decoder is not None:
+            self._masks_decoder.shutdown()
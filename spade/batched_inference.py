@@ -0,0 +1,153 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import numpy.typing as npt
+import torch
+
+from spade.onnx_backend import OnnxPix2PixModel
+from spade.pix2pix_model import Pix2PixModel
+from spade.transfer_buffers import TransferBuffers, TransferSlot
+
+# live frames are taken before speculative ones, requests of the same priority in submission order;
+# shutdown comes first and cancels the requests still queued
+_SHUTDOWN_PRIORITY = -1
+LIVE_PRIORITY = 0
+SPECULATIVE_PRIORITY = 1
+
+
+class BatchedInferenceEngine:
+    def __init__(self, model: Pix2PixModel | OnnxPix2PixModel, device: torch.device, max_batch_size: int, max_wait: float,
+                 resolution: tuple[int, int]):
+        self.logger = logging.getLogger()
+
+        self._model = model
+        self._device = device
+        self._max_batch_size = max(1, max_batch_size)
+        self._max_wait = max_wait
+
+        self._transfer_buffers = {resolution: TransferBuffers(device, self._max_batch_size, resolution)}
+
+        self._requests: queue.PriorityQueue[tuple[int, int, tuple[npt.NDArray[np.uint8], Future] | None]] = \
+            queue.PriorityQueue()
+        self._requests_order = itertools.count()
+
+        self._thread = threading.Thread(target=self._process_requests, name='spade_inference', daemon=True)
+        self._thread.start()
+
+    def submit(self, mask: npt.NDArray[np.uint8], priority: int = LIVE_PRIORITY) -> Future:
+        future = Future()
+        self._requests.put((priority, next(self._requests_order), (mask, future)))
+        return future
+
+    def _get_request(self, timeout: float | None = None) -> tuple[npt.NDArray[np.uint8], Future] | None:
+        return self._requests.get(timeout=timeout)[2]
+
+    def _process_requests(self):
+        running = True
+        # launched batch whose results are read out after the next one is launched, so uploads overlap compute
+        pending_batch = None
+
+        while running:
+            if pending_batch is not None and self._requests.empty():
+                self._finish_batch(*pending_batch)
+                pending_batch = None
+
+            request = self._get_request()
+            if request is None:
+                break
+
+            batch = [request]
+            deadline = time.monotonic() + self._max_wait
+
+            # requests queued meanwhile join the batch, up to max_wait after the first one
+            while len(batch) < self._max_batch_size:
+                try:
+                    request = self._get_request(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+
+                if request is None:
+                    running = False
+                    break
+
+                batch.append(request)
+
+            batch = [(mask, future) for mask, future in batch if future.set_running_or_notify_cancel()]
+
+            for masks_shape in {mask.shape for mask, _ in batch}:
+                launched_batch = self._launch_batch([(mask, future) for mask, future in batch if mask.shape == masks_shape])
+
+                if pending_batch is not None:
+                    self._finish_batch(*pending_batch)
+                pending_batch = launched_batch
+
+        if pending_batch is not None:
+            self._finish_batch(*pending_batch)
+
+        while not self._requests.empty():
+            request = self._requests.get_nowait()[2]
+            if request is not None:
+                request[1].cancel()
+
+    def _launch_batch(self, batch: list[tuple[npt.NDArray[np.uint8], Future]]) -> tuple[TransferSlot | None, list]:
+        try:
+            return self.launch([mask for mask, _ in batch]), batch
+        except Exception as error:
+            for _, future in batch:
+                future.set_exception(error)
+            return None, []
+
+    def _finish_batch(self, slot: TransferSlot | None, batch: list[tuple[npt.NDArray[np.uint8], Future]]):
+        if slot is None:
+            return
+
+        try:
+            images = self.collect(slot)
+        except Exception as error:
+            for _, future in batch:
+                future.set_exception(error)
+            return
+
+        for image, (_, future) in zip(images, batch):
+            future.set_result(image)
+
+    def launch(self, masks: list[npt.NDArray[np.uint8]]) -> TransferSlot:
+        height, width = masks[0].shape
+
+        transfer_buffers = self._transfer_buffers.get((width, height))
+        if transfer_buffers is None:
+            self.logger.warning(f'Masks of {width}x{height} differ from content resolution, allocating their buffers')
+            transfer_buffers = self._transfer_buffers[(width, height)] = TransferBuffers(
+                self._device, self._max_batch_size, (width, height)
+            )
+
+        launch_time = time.time()
+        slot = transfer_buffers.upload(masks)
+        slot.launch_time = launch_time
+
+        with torch.no_grad():
+            data = transfer_buffers.build_data(slot)
+
+            generated = self._model(data, mode='inference')
+
+            slot.download(generated)
+
+        return slot
+
+    def collect(self, slot: TransferSlot) -> list[npt.NDArray[np.uint8]]:
+        images = slot.collect()
+        self.logger.info(f"inference of {len(images)} masks took {time.time() - slot.launch_time:.4f} seconds.")
+
+        return images
+
+    def generate(self, masks: list[npt.NDArray[np.uint8]]) -> list[npt.NDArray[np.uint8]]:
+        return self.collect(self.launch(masks))
+
+    def shutdown(self):
+        self._requests.put((_SHUTDOWN_PRIORITY, next(self._requests_order), None))
+        self._thread.join()
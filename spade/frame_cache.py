@@ -0,0 +1,166 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+from reactivex.scheduler import EventLoopScheduler
+
+# states and frame keys of the sequences pre-rendered by prerender.py, with the salt they were rendered with
+INDEX_FILE_NAME = 'index.json'
+
+
+class FrameCache:
+    def __init__(self, max_bytes: int, key_salt: str, disk_path: str | None = None, disk_format: str = '.png'):
+        self.logger = logging.getLogger()
+
+        self._max_bytes = max_bytes
+        self._key_salt = key_salt.encode()
+
+        self._entries: OrderedDict[str, npt.NDArray[np.uint8]] = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+
+        self._disk_path = Path(disk_path) if disk_path else None
+        self._disk_format = disk_format
+        # encoding large frames takes longer than a lookup, so disk writes never block the caller
+        self._disk_scheduler = EventLoopScheduler() if self._disk_path is not None else None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self._disk_path is not None:
+            self.check_disk_index()
+
+    def build_key(self, label_map: npt.NDArray[np.uint8]) -> str:
+        label_map = np.ascontiguousarray(label_map)
+
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(self._key_salt)
+        digest.update(str(label_map.shape).encode())
+        digest.update(label_map.data)
+
+        return digest.hexdigest()
+
+    def check_disk_index(self):
+        index_path = self._disk_path / INDEX_FILE_NAME
+        if not index_path.exists():
+            return
+
+        index = json.loads(index_path.read_text())
+        stale_sequences = [
+            sequence_name for sequence_name, sequence_index in index.items()
+            if sequence_index['frame_key_salt'].encode() != self._key_salt
+        ]
+
+        if stale_sequences:
+            self.logger.warning(f'{len(stale_sequences)} of {len(index)} pre-rendered sequences were rendered with other '
+                                f'settings and their frames will not be found, re-run prerender.py: '
+                                f'{", ".join(stale_sequences)}')
+        else:
+            self.logger.info(f'{len(index)} pre-rendered sequences match the current settings')
+
+    def get_disk_file_path(self, key: str) -> Path | None:
+        if self._disk_path is None:
+            return None
+
+        return self._disk_path / key[:2] / f'{key}{self._disk_format}'
+
+    def contains(self, key: str) -> bool:
+        # without loading the frame or counting a lookup
+        with self._lock:
+            if key in self._entries:
+                return True
+
+        disk_file_path = self.get_disk_file_path(key)
+        return disk_file_path is not None and disk_file_path.exists()
+
+    def get(self, key: str) -> npt.NDArray[np.uint8] | None:
+        with self._lock:
+            image = self._entries.get(key)
+
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return image
+
+        disk_file_path = self.get_disk_file_path(key)
+        if disk_file_path is not None and disk_file_path.exists():
+            image = cv2.imread(str(disk_file_path), cv2.IMREAD_COLOR)
+
+            if image is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._put_in_memory(key, image)
+                return image
+
+        with self._lock:
+            self.misses += 1
+
+        return None
+
+    def put(self, key: str, image: npt.NDArray[np.uint8]):
+        self._put_in_memory(key, image)
+
+        if self._disk_scheduler is not None:
+            self._disk_scheduler.schedule(lambda *_: self.write_to_disk(key, image))
+
+    def write_to_disk(self, key: str, image: npt.NDArray[np.uint8], overwrite: bool = False):
+        disk_file_path = self.get_disk_file_path(key)
+
+        if disk_file_path is None or (disk_file_path.exists() and not overwrite):
+            return
+
+        try:
+            success, encoded_image = cv2.imencode(self._disk_format, image)
+            assert success, f'cannot encode frame {key}'
+
+            disk_file_path.parent.mkdir(parents=True, exist_ok=True)
+            temporary_path = disk_file_path.with_name(disk_file_path.name + '.tmp')
+            temporary_path.write_bytes(encoded_image.tobytes())
+            os.replace(temporary_path, disk_file_path)
+        except Exception as error:
+            self.logger.warning(f'Frame cache write failed for {key}: {error}')
+
+    def _put_in_memory(self, key: str, image: npt.NDArray[np.uint8]):
+        if image.nbytes > self._max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._size_bytes -= self._entries.pop(key).nbytes
+
+            self._entries[key] = image
+            self._size_bytes += image.nbytes
+
+            while self._size_bytes > self._max_bytes:
+                _, evicted_image = self._entries.popitem(last=False)
+                self._size_bytes -= evicted_image.nbytes
+                self.evictions += 1
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+
+            return {
+                'entries': len(self._entries),
+                'size_bytes': self._size_bytes,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': hits / lookups if lookups > 0 else 0.0
+            }
+
+    def shutdown(self):
+        if self._disk_scheduler is not None:
+            self._disk_scheduler.dispose()
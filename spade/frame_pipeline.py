@@ -0,0 +1,153 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable
+
+
+class DropOldestQueue:
+    # bounded queue of live frames, a full queue drops its oldest frame in favour of the new one
+    def __init__(self, max_size: int):
+        self._max_size = max(1, max_size)
+        self._items: deque = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+
+        self.max_depth = 0
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._items)
+
+    def put(self, item) -> Any | None:
+        with self._condition:
+            if self._closed:
+                return item
+
+            dropped = self._items.popleft() if len(self._items) >= self._max_size else None
+
+            self._items.append(item)
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._condition.notify()
+
+        return dropped
+
+    def get(self) -> Any | None:
+        # None once the queue is closed
+        with self._condition:
+            while not self._items and not self._closed:
+                self._condition.wait()
+
+            return self._items.popleft() if not self._closed else None
+
+    def close(self) -> list:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+            items = list(self._items)
+            self._items.clear()
+
+        return items
+
+
+class PipelineStage:
+    def __init__(self, name: str, function: Callable[[Any], Any], queue_size: int, smoothing: float = 0.1):
+        self.logger = logging.getLogger()
+
+        self.name = name
+        self._function = function
+        self._queue = DropOldestQueue(queue_size)
+        self._smoothing = smoothing
+        self._lock = threading.Lock()
+
+        self.next_stage: PipelineStage | None = None
+
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self._wait_time = None
+        self._process_time = None
+
+        self._thread = threading.Thread(target=self._process_frames, name=f'{name}_stage', daemon=True)
+        self._thread.start()
+
+    def put(self, frame, future: Future):
+        dropped = self._queue.put((frame, future, time.perf_counter()))
+
+        if dropped is not None:
+            with self._lock:
+                self.dropped += 1
+            dropped[1].cancel()
+
+    def _process_frames(self):
+        while (item := self._queue.get()) is not None:
+            frame, future, enqueue_time = item
+            if future.cancelled():
+                continue
+
+            start_time = time.perf_counter()
+            try:
+                result = self._function(frame)
+            except Exception as error:
+                self.logger.exception(f'Frame pipeline {self.name} stage failed')
+                with self._lock:
+                    self.failed += 1
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(error)
+                continue
+
+            with self._lock:
+                self.processed += 1
+                self._wait_time = self._smooth(self._wait_time, start_time - enqueue_time)
+                self._process_time = self._smooth(self._process_time, time.perf_counter() - start_time)
+
+            if self.next_stage is not None:
+                self.next_stage.put(result, future)
+            elif future.set_running_or_notify_cancel():
+                future.set_result(result)
+
+    def _smooth(self, average: float | None, value: float) -> float:
+        return value if average is None else average + self._smoothing * (value - average)
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'depth': len(self._queue),
+                'max_depth': self._queue.max_depth,
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'wait_time': self._wait_time or 0.0,
+                'process_time': self._process_time or 0.0
+            }
+
+    def shutdown(self):
+        for _, future, _ in self._queue.close():
+            future.cancel()
+        self._thread.join()
+
+
+class FramePipeline:
+    # stages on their own workers connected by drop-oldest queues, so consecutive frames overlap across the stages
+    # and the throughput is bound by the slowest stage; frames dropped for newer ones have their futures cancelled
+    def __init__(self, stages: list[tuple[str, Callable[[Any], Any]]], queue_size: int = 1):
+        self.stages = [PipelineStage(name, function, queue_size) for name, function in stages]
+
+        for stage, next_stage in zip(self.stages, self.stages[1:]):
+            stage.next_stage = next_stage
+
+    def submit(self, frame, future: Future | None = None) -> Future:
+        future = future if future is not None else Future()
+        self.stages[0].put(frame, future)
+        return future
+
+    @property
+    def stats(self) -> dict[str, dict]:
+        return {stage.name: stage.stats for stage in self.stages}
+
+    def shutdown(self):
+        for stage in self.stages:
+            stage.shutdown()
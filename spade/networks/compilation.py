@@ -0,0 +1,19 @@
+import torch
+import torch.nn as nn
+
+COMPILE_MODES = ['eager', 'trace', 'compile']
+
+
+def compile_network(network: nn.Module, mode: str, example_input: torch.Tensor):
+    assert mode in COMPILE_MODES, f'unknown compile mode {mode}, expected one of {COMPILE_MODES}'
+
+    if mode == 'trace':
+        # control flow on the configuration is resolved once, the graph is fixed for content_resolution
+        with torch.no_grad():
+            traced_network = torch.jit.trace(network, example_input, check_trace=False)
+        return torch.jit.freeze(traced_network)
+
+    if mode == 'compile':
+        return torch.compile(network, dynamic=False)
+
+    return network
@@ -8,6 +8,8 @@ import torch.nn.functional as F
 
 from spade.networks.architecture import SPADEResnetBlock
 from spade.networks.base_network import BaseNetwork
+from spade.networks.label_pyramid import LabelPyramid, SegmapPyramid
+from spade.networks.normalization import SPADE
 
 
 class SPADEGenerator(BaseNetwork):
@@ -40,7 +42,10 @@ class SPADEGenerator(BaseNetwork):
 
         self.up = nn.Upsample(scale_factor=2)
 
-    def compute_latent_vector_size(self, opt):
+        self.use_segmap_pyramid = opt.use_segmap_pyramid
+
+    @staticmethod
+    def get_upsampling_factor(opt):
         if opt.num_upsampling_layers == 'normal':
             num_up_layers = 5
         elif opt.num_upsampling_layers == 'more':
@@ -51,15 +56,49 @@ class SPADEGenerator(BaseNetwork):
             raise ValueError('opt.num_upsampling_layers [%s] not recognized' %
                              opt.num_upsampling_layers)
 
-        sw = opt.crop_size // (2**num_up_layers)
+        return 2**num_up_layers
+
+    def compute_latent_vector_size(self, opt):
+        sw = opt.crop_size // self.get_upsampling_factor(opt)
         sh = round(sw / opt.aspect_ratio)
 
         return sw, sh
 
-    def forward(self, input, z=None):
+    def set_modulation_cache(self, enabled):
+        for module in self.modules():
+            if isinstance(module, SPADE):
+                module.cache_modulation = enabled
+                module.dirty_region = None
+
+    def set_modulation_dirty_region(self, region):
+        for module in self.modules():
+            if isinstance(module, SPADE):
+                module.dirty_region = region
+
+    def get_modulation_recomputed_fractions(self):
+        # average over the SPADE layers of every residual block
+        fractions = {}
+        for name, block in self.named_children():
+            spades = [module for module in block.modules() if isinstance(module, SPADE)]
+            if spades:
+                fractions[name] = sum(spade.recomputed_fraction for spade in spades) / len(spades)
+
+        return fractions
+
+    def forward(self, input, z=None, latent_size=None):
         seg = input
+        # tiles of the label map start from a latent of their own size, (width, height)
+        sw, sh = latent_size if latent_size is not None else (self.sw, self.sh)
 
-        x = F.interpolate(seg, size=(self.sh, self.sw))
+        if self.use_segmap_pyramid and not isinstance(seg, LabelPyramid):
+            seg = SegmapPyramid(seg)
+
+        if isinstance(seg, LabelPyramid):
+            x = seg.get_one_hot((sh, sw))
+        elif isinstance(seg, SegmapPyramid):
+            x = seg.get_segmap((sh, sw))
+        else:
+            x = F.interpolate(seg, size=(sh, sw))
         x = self.fc(x)
 
         x = self.head_0(x, seg)
@@ -0,0 +1,62 @@
+import torch
+import torch.nn as nn
+from torch.nn.modules.batchnorm import _BatchNorm
+from torch.nn.utils import remove_spectral_norm
+from torch.nn.utils.spectral_norm import SpectralNorm
+
+from spade.networks.normalization import SPADE
+
+
+def remove_spectral_norms(network: nn.Module) -> int:
+    removed_count = 0
+
+    for module in network.modules():
+        if any(isinstance(hook, SpectralNorm) for hook in module._forward_pre_hooks.values()):
+            # bakes weight_orig / sigma computed from the stored power iteration vectors, as in eval forward
+            remove_spectral_norm(module)
+            removed_count += 1
+
+    return removed_count
+
+
+@torch.no_grad()
+def fold_spade_normalization(spade: SPADE) -> bool:
+    norm = spade.param_free_norm
+
+    if not isinstance(norm, _BatchNorm) or not norm.track_running_stats:
+        return False
+
+    # eval batch norm is x * scale + shift, so
+    # (x * scale + shift) * (1 + gamma) + beta == x * (1 + gamma') + beta' with
+    # gamma' = scale * (1 + gamma) - 1 and beta' = beta + shift * (1 + gamma)
+    scale = torch.rsqrt(norm.running_var.double() + norm.eps)
+    shift = -norm.running_mean.double() * scale
+    if norm.affine:
+        shift = shift * norm.weight.double() + norm.bias.double()
+        scale = scale * norm.weight.double()
+
+    gamma_weight, gamma_bias = spade.mlp_gamma.weight.double(), spade.mlp_gamma.bias.double()
+    beta_weight, beta_bias = spade.mlp_beta.weight.double(), spade.mlp_beta.bias.double()
+
+    spade.mlp_beta.weight.copy_(beta_weight + shift[:, None, None, None] * gamma_weight)
+    spade.mlp_beta.bias.copy_(beta_bias + shift * (1 + gamma_bias))
+    spade.mlp_gamma.weight.copy_(scale[:, None, None, None] * gamma_weight)
+    spade.mlp_gamma.bias.copy_(scale * (1 + gamma_bias) - 1)
+
+    spade.param_free_norm = nn.Identity()
+
+    return True
+
+
+def fuse_for_inference(network: nn.Module) -> tuple[int, int]:
+    assert not network.training, 'batch norm can be folded only with running statistics of eval mode'
+
+    removed_spectral_norms = remove_spectral_norms(network)
+    folded_norms = sum(fold_spade_normalization(module) for module in list(network.modules()) if isinstance(module, SPADE))
+
+    return removed_spectral_norms, folded_norms
+
+
+@torch.no_grad()
+def compare_networks_outputs(reference_network: nn.Module, network: nn.Module, *inputs) -> float:
+    return (reference_network(*inputs).float() - network(*inputs).float()).abs().max().item()
@@ -0,0 +1,89 @@
+import torch
+import torch.nn.functional as F
+
+
+# Label map kept as class indices, with the nearest-downsampled maps of every
+# resolution built once per frame and shared by all SPADE layers. Nearest
+# resampling commutes with one-hot encoding, so these are exactly the indices
+# of the one-hot maps F.interpolate produces for the dense input.
+class LabelPyramid:
+    def __init__(self, label_map, semantic_nc):
+        self.label_map = label_map.long()
+        self.semantic_nc = semantic_nc
+        self._labels = {}
+        self._offset_indices = {}
+
+    def size(self):
+        return self.label_map.size()
+
+    def get_labels(self, size):
+        size = tuple(size)
+
+        if size not in self._labels:
+            if size == tuple(self.label_map.size()[2:]):
+                self._labels[size] = self.label_map
+            else:
+                self._labels[size] = F.interpolate(self.label_map.float(), size=size, mode='nearest').long()
+
+        return self._labels[size]
+
+    def get_one_hot(self, size):
+        labels = self.get_labels(size)
+        batch_size, _, height, width = labels.size()
+
+        one_hot = torch.zeros(batch_size, self.semantic_nc, height, width, device=labels.device)
+        return one_hot.scatter_(1, labels, 1.0)
+
+    def get_offset_indices(self, size, kernel_size):
+        key = (tuple(size), kernel_size)
+
+        if key not in self._offset_indices:
+            self._offset_indices[key] = build_offset_indices(self.get_labels(size), kernel_size, self.semantic_nc)
+
+        return self._offset_indices[key]
+
+
+# Dense one-hot segmap with its nearest-downsampled versions computed once per
+# frame, instead of every SPADE layer interpolating the full-resolution map.
+class SegmapPyramid:
+    def __init__(self, segmap):
+        self.segmap = segmap
+        self._segmaps = {tuple(segmap.size()[2:]): segmap}
+
+    def size(self):
+        return self.segmap.size()
+
+    def get_segmap(self, size):
+        size = tuple(size)
+
+        if size not in self._segmaps:
+            self._segmaps[size] = F.interpolate(self.segmap, size=size, mode='nearest')
+
+        return self._segmaps[size]
+
+
+def build_offset_indices(labels, kernel_size, semantic_nc):
+    # row of the embedding table for every pixel and kernel offset; class semantic_nc
+    # stands for the zero padding around the map and has an all-zero row
+    batch_size, _, height, width = labels.size()
+    padding = kernel_size // 2
+
+    padded_labels = F.pad(labels[:, 0], (padding, padding, padding, padding), value=semantic_nc)
+
+    offsets = [
+        padded_labels[:, offset_y:offset_y + height, offset_x:offset_x + width] + (offset_y * kernel_size + offset_x) * (semantic_nc + 1)
+        for offset_y in range(kernel_size)
+        for offset_x in range(kernel_size)
+    ]
+
+    return torch.stack(offsets, dim=-1).view(batch_size * height * width, kernel_size * kernel_size)
+
+
+def build_embedding_table(conv_weight):
+    # (out, classes, k, k) weights of a convolution on one-hot input -> (k * k * (classes + 1), out) table
+    out_channels, classes_count, kernel_height, kernel_width = conv_weight.size()
+
+    table = conv_weight.new_zeros(kernel_height * kernel_width, classes_count + 1, out_channels)
+    table[:, :classes_count] = conv_weight.permute(2, 3, 1, 0).reshape(kernel_height * kernel_width, classes_count, out_channels)
+
+    return table.view(-1, out_channels)
@@ -3,11 +3,14 @@ Copyright (C) 2019 NVIDIA Corporation.  All rights reserved.
 Licensed under the CC BY-NC-SA 4.0 license (https://creativecommons.org/licenses/by-nc-sa/4.0/legalcode).
 """
 
+import math
 import re
+import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import torch.nn.utils.spectral_norm as spectral_norm
 
+from spade.networks.label_pyramid import LabelPyramid, SegmapPyramid, build_offset_indices, build_embedding_table
 from spade.networks.sync_batchnorm import SynchronizedBatchNorm2d
 
 
@@ -93,18 +96,108 @@ class SPADE(nn.Module):
         self.mlp_gamma = nn.Conv2d(nhidden, norm_nc, kernel_size=ks, padding=pw)
         self.mlp_beta = nn.Conv2d(nhidden, norm_nc, kernel_size=ks, padding=pw)
 
+        # Incremental inference keeps gamma and beta of the previous frame and
+        # recomputes them only around |dirty_region| of the label map
+        # (y_start, y_end, x_start, x_end), None meaning the whole map changed.
+        self.cache_modulation = False
+        self.dirty_region = None
+        self.recomputed_fraction = 1.0
+        self._receptive_padding = 2 * pw
+        self._cached_gamma = None
+        self._cached_beta = None
+
+        # mlp_shared weights as an embedding table for label index input
+        self._label_embedding = None
+        self._label_embedding_version = None
+
     def forward(self, x, segmap):
 
         # Part 1. generate parameter-free normalized activations
         normalized = self.param_free_norm(x)
 
         # Part 2. produce scaling and bias conditioned on semantic map
-        segmap = F.interpolate(segmap, size=x.size()[2:], mode='nearest')
-        actv = self.mlp_shared(segmap)
-        gamma = self.mlp_gamma(actv)
-        beta = self.mlp_beta(actv)
+        gamma, beta = self.compute_modulation(segmap, x.size()[2:])
 
         # apply scale and bias
         out = normalized * (1 + gamma) + beta
 
         return out
+
+    def compute_modulation(self, segmap, size):
+        label_height, label_width = segmap.size()[2:]
+        # a label pyramid yields class indices, a dense one-hot segmap is resized as a whole
+        label_pyramid = segmap if isinstance(segmap, LabelPyramid) else None
+        if label_pyramid is not None:
+            segmap = label_pyramid.get_labels(size)
+        elif isinstance(segmap, SegmapPyramid):
+            segmap = segmap.get_segmap(size)
+        else:
+            segmap = F.interpolate(segmap, size=size, mode='nearest')
+
+        cache_valid = (
+            self.cache_modulation and self.dirty_region is not None and self._cached_gamma is not None
+            and self._cached_gamma.size()[2:] == segmap.size()[2:] and self._cached_gamma.size(0) == segmap.size(0)
+        )
+
+        if not cache_valid:
+            offset_indices = label_pyramid.get_offset_indices(size, self.mlp_shared[0].kernel_size[0]) if label_pyramid is not None else None
+            gamma, beta = self._modulation(segmap, offset_indices)
+            self.recomputed_fraction = 1.0
+
+            # batched requests are unrelated label maps, nothing to reuse
+            keep_cache = self.cache_modulation and segmap.size(0) == 1
+            self._cached_gamma, self._cached_beta = (gamma, beta) if keep_cache else (None, None)
+
+            return gamma, beta
+
+        height, width = segmap.size()[2:]
+        y_start, y_end, x_start, x_end = self.dirty_region
+
+        if y_start >= y_end or x_start >= x_end:
+            self.recomputed_fraction = 0.0
+            return self._cached_gamma, self._cached_beta
+
+        # dirty region at this resolution, grown by the receptive field of the modulation convolutions
+        padding = self._receptive_padding
+        y_start = max(0, math.floor(y_start * height / label_height) - padding)
+        y_end = min(height, math.ceil(y_end * height / label_height) + padding)
+        x_start = max(0, math.floor(x_start * width / label_width) - padding)
+        x_end = min(width, math.ceil(x_end * width / label_width) + padding)
+
+        # the window has one more receptive field margin, so zero padding at its
+        # borders does not leak into the recomputed region
+        window_y_start, window_y_end = max(0, y_start - padding), min(height, y_end + padding)
+        window_x_start, window_x_end = max(0, x_start - padding), min(width, x_end + padding)
+
+        gamma, beta = self._modulation(segmap[:, :, window_y_start:window_y_end, window_x_start:window_x_end])
+        region_y, region_x = slice(y_start - window_y_start, y_end - window_y_start), slice(x_start - window_x_start, x_end - window_x_start)
+
+        self._cached_gamma[:, :, y_start:y_end, x_start:x_end] = gamma[:, :, region_y, region_x]
+        self._cached_beta[:, :, y_start:y_end, x_start:x_end] = beta[:, :, region_y, region_x]
+        self.recomputed_fraction = (window_y_end - window_y_start) * (window_x_end - window_x_start) / (height * width)
+
+        return self._cached_gamma, self._cached_beta
+
+    def _modulation(self, segmap, offset_indices=None):
+        if segmap.dtype == torch.long:
+            actv = F.relu(self._embed_labels(segmap, offset_indices))
+        else:
+            actv = self.mlp_shared(segmap)
+
+        return self.mlp_gamma(actv), self.mlp_beta(actv)
+
+    def _embed_labels(self, labels, offset_indices=None):
+        # equals mlp_shared's convolution on the one-hot map: a sum of the weight
+        # columns picked by the classes under every kernel offset
+        conv = self.mlp_shared[0]
+        batch_size, _, height, width = labels.size()
+
+        if self._label_embedding is None or self._label_embedding_version != (conv.weight._version, conv.weight.device, conv.weight.dtype):
+            self._label_embedding = build_embedding_table(conv.weight.detach())
+            self._label_embedding_version = (conv.weight._version, conv.weight.device, conv.weight.dtype)
+
+        if offset_indices is None:
+            offset_indices = build_offset_indices(labels, conv.kernel_size[0], conv.in_channels)
+
+        actv = F.embedding_bag(offset_indices, self._label_embedding, mode='sum') + conv.bias
+        return actv.view(batch_size, height, width, -1).permute(0, 3, 1, 2).contiguous()
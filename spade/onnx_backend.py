@@ -0,0 +1,74 @@
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from config.modules_configs.spade_config import SpadeConfig
+
+
+def get_generator_onnx_path(config: SpadeConfig) -> Path:
+    return Path(config.onnx_path) / f'{config.model_name}_generator.onnx'
+
+
+def get_upscaler_onnx_path(config: SpadeConfig) -> Path:
+    return Path(config.onnx_path) / f'{Path(config.upscaler_model).stem}_x{config.upscale_scale}.onnx'
+
+
+def create_onnx_session(onnx_path: Path, threads_count: int):
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads_count > 0:
+        options.intra_op_num_threads = threads_count
+
+    return onnxruntime.InferenceSession(str(onnx_path), options, providers=['CPUExecutionProvider'])
+
+
+class LabelMapGenerator(nn.Module):
+    # exported graph takes the label map, so the dense one-hot never crosses the runtime boundary
+    def __init__(self, generator: nn.Module, semantic_nc: int):
+        super().__init__()
+        self.generator = generator
+        self.semantic_nc = semantic_nc
+
+    def forward(self, label_map):
+        batch_size, _, height, width = label_map.size()
+        input_semantics = torch.zeros(batch_size, self.semantic_nc, height, width, device=label_map.device)
+        input_semantics = input_semantics.scatter_(1, label_map.long(), 1.0)
+
+        return self.generator(input_semantics)
+
+
+class OnnxPix2PixModel:
+    def __init__(self, config: SpadeConfig):
+        self.opt = config
+
+        onnx_path = get_generator_onnx_path(config)
+        assert onnx_path.exists(), f'{onnx_path} not found, export it with export_onnx.py'
+
+        self._session = create_onnx_session(onnx_path, config.onnx_threads)
+        self._input_name = self._session.get_inputs()[0].name
+
+    def __call__(self, data, mode):
+        if mode != 'inference':
+            raise ValueError("|mode| is invalid")
+
+        label_map = data['label'].cpu().numpy().astype(np.float32)
+        generated, = self._session.run(None, {self._input_name: label_map})
+
+        return torch.from_numpy(generated)
+
+    def warm_up(self, iterations: int = 2):
+        start_time = time.time()
+
+        width, height = self.opt.content_resolution
+        label_map = torch.randint(0, self.opt.label_nc + 1, (1, 1, height, width)).float()
+
+        for _ in range(iterations):
+            self({'label': label_map}, mode='inference')
+
+        logging.getLogger().info(f'ONNX generator warm-up took {time.time() - start_time:.2f}s')
@@ -1,7 +1,15 @@
+import copy
+import logging
+import time
+
 import torch
 
 from config.modules_configs.spade_config import SpadeConfig
+from spade.networks.compilation import compile_network
 from spade.networks.generator import SPADEGenerator
+from spade.networks.inference_fusion import fuse_for_inference, compare_networks_outputs
+from spade.networks.label_pyramid import LabelPyramid
+from spade.tiled_generation import TiledGenerator
 
 
 class Pix2PixModel(torch.nn.Module):
@@ -17,29 +25,170 @@ class Pix2PixModel(torch.nn.Module):
         weights = torch.load(config.weights_path, weights_only=True)
         self.netG.load_state_dict(weights)
 
+        self.tiled_generator = None
+        if config.tile_size is not None:
+            upsampling_factor = SPADEGenerator.get_upsampling_factor(config)
+            assert all(size % upsampling_factor == 0 for size in config.tile_size), \
+                f'tile size {config.tile_size} has to be a multiple of {upsampling_factor}'
+
+            if config.incremental_modulation:
+                logging.getLogger().warning('Incremental modulation is not used with tiled generation')
+
+            self.tiled_generator = TiledGenerator(self._generate_tile, config.tile_size, config.tile_overlap, config.tile_workers)
+
+        self.netG.set_modulation_cache(config.incremental_modulation and self.tiled_generator is None)
+        self._previous_label_map = None
+
+        self.compiled_netG = None
+
+        self.autocast_dtype = None
+        self.memory_format = torch.contiguous_format
+
+    def set_precision(self, dtype: torch.dtype | None, channels_last: bool = False):
+        # reduced precision runs under autocast, the weights stay fp32 so going back to fp32 is lossless
+        self.autocast_dtype = dtype
+        self.memory_format = torch.channels_last if channels_last else torch.contiguous_format
+        self.netG.to(memory_format=self.memory_format)
+
+        # modulation maps cached by incremental modulation were computed in the previous precision
+        self._previous_label_map = None
+
+    def autocast(self):
+        return torch.autocast(device_type=self.device.type, dtype=self.autocast_dtype, enabled=self.autocast_dtype is not None)
+
+    def fuse_for_inference(self, verification_tolerance: float | None = None) -> bool:
+        logger = logging.getLogger()
+
+        reference_netG = copy.deepcopy(self.netG) if verification_tolerance is not None else None
+
+        removed_spectral_norms, folded_norms = fuse_for_inference(self.netG)
+        logger.info(f'Generator fused for inference: {removed_spectral_norms} spectral norms removed, '
+                    f'{folded_norms} batch norms folded into SPADE modulation')
+
+        if reference_netG is None:
+            return True
+
+        max_difference = compare_networks_outputs(reference_netG, self.netG, self._build_example_semantics())
+        logger.info(f'Fused generator max output difference: {max_difference:.2e}')
+
+        if max_difference > verification_tolerance:
+            logger.warning(f'Fused generator exceeds tolerance {verification_tolerance:.1e}, using the original one')
+            self.netG = reference_netG
+            return False
+
+        return True
+
+    def compile_generator(self, mode: str):
+        self.compiled_netG = None
+
+        if mode != 'eager' and self.opt.incremental_modulation:
+            logging.getLogger().warning(f'Incremental modulation keeps state between frames, {mode} mode is not used')
+            return
+
+        if mode != 'eager' and self.tiled_generator is not None:
+            logging.getLogger().warning(f'Tiles set their own latent size, {mode} mode is not used')
+            return
+
+        with self.autocast():
+            self.compiled_netG = compile_network(self.netG, mode, self._build_example_semantics(dense=True)) if mode != 'eager' else None
+
+    def warm_up(self, iterations: int = 2):
+        # compilation and device kernels selection happen here instead of on the first visible frame
+        start_time = time.time()
+
+        if self.tiled_generator is not None:
+            label_map = self._build_example_label_map()
+            for _ in range(iterations):
+                self.tiled_generator(label_map)
+        else:
+            input_semantics = self._build_example_semantics()
+            with torch.no_grad():
+                for _ in range(iterations):
+                    self.generate(input_semantics)
+
+        logging.getLogger().info(f'Generator warm-up took {time.time() - start_time:.2f}s')
+
+    def generate(self, input_semantics, latent_size=None):
+        with self.autocast():
+            if self.compiled_netG is not None and latent_size is None:
+                return self.compiled_netG(input_semantics)
+
+            return self.netG(input_semantics, z=None, latent_size=latent_size)
+
+    def _generate_tile(self, label_map):
+        # runs on the tile workers, grad and autocast modes are per thread
+        height, width = label_map.size()[2:]
+        upsampling_factor = SPADEGenerator.get_upsampling_factor(self.opt)
+
+        with torch.no_grad():
+            input_semantics = self.build_input_semantics(label_map, not self.opt.label_index_input)
+            return self.generate(input_semantics, latent_size=(width // upsampling_factor, height // upsampling_factor))
+
+    def _build_example_label_map(self):
+        width, height = self.opt.content_resolution
+        return torch.randint(0, self.opt.label_nc + 1, (1, 1, height, width), device=self.device)
+
+    def _build_example_semantics(self, dense=False):
+        label_map = self._build_example_label_map()
+        return self.build_input_semantics(label_map, dense or not self.opt.label_index_input or self.compiled_netG is not None)
 
     def forward(self, data, mode):
+        if mode == 'inference' and self.tiled_generator is not None:
+            return self.tiled_generator(data['label'].to(self.device))
+
         input_semantics, real_image = self.preprocess_input(data)
 
         if mode == 'inference':
+            if self.opt.incremental_modulation:
+                self._update_modulation_dirty_region(data['label'])
+
             with torch.no_grad():
-                fake_image = self.netG(input_semantics, z=None)
+                fake_image = self.generate(input_semantics)
+
+            if self.opt.incremental_modulation:
+                fractions = self.netG.get_modulation_recomputed_fractions()
+                logging.getLogger().info('SPADE modulation recomputed: ' + ', '.join(
+                    f'{name} {fraction:.0%}' for name, fraction in fractions.items()
+                ))
 
             return fake_image
         else:
             raise ValueError("|mode| is invalid")
 
+    def _update_modulation_dirty_region(self, label_map):
+        previous_label_map = self._previous_label_map
+
+        if label_map.size(0) != 1 or previous_label_map is None or previous_label_map.size() != label_map.size():
+            region = None
+        else:
+            changed = (label_map != previous_label_map)[0, 0]
+            rows = torch.nonzero(changed.any(dim=1)).flatten().tolist()
+            columns = torch.nonzero(changed.any(dim=0)).flatten().tolist()
+            region = (rows[0], rows[-1] + 1, columns[0], columns[-1] + 1) if rows else (0, 0, 0, 0)
+
+        self._previous_label_map = label_map.clone() if label_map.size(0) == 1 else None
+        self.netG.set_modulation_dirty_region(region)
+
     def preprocess_input(self, data):
         data['label'] = data['label'].to(self.device)
         data['instance'] = data['instance'].to(self.device)
         if 'image' in data:
             data['image'] = data['image'].to(self.device)
 
-        label_map = data['label']
-        bs, _, h, w = label_map.size()
+        # compiled generators are specialized for the dense one-hot input
+        dense = not self.opt.label_index_input or self.compiled_netG is not None
+
+        return self.build_input_semantics(data['label'], dense), data['image']
+
+    def build_input_semantics(self, label_map, dense=True):
         nc = self.opt.label_nc + 1
-        
+
+        if not dense:
+            return LabelPyramid(label_map, nc)
+
+        bs, _, h, w = label_map.size()
+
         input_label = torch.zeros(bs, nc, h, w, device=self.device)
         input_semantics = input_label.scatter_(1, label_map.long(), 1.0)
 
-        return input_semantics, data['image']
+        return input_semantics.contiguous(memory_format=self.memory_format)
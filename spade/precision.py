@@ -0,0 +1,48 @@
+import logging
+
+import cv2
+import numpy as np
+import numpy.typing as npt
+import torch
+
+from config.modules_configs.spade_config import SpadeConfig
+
+PRECISIONS = ['auto', 'fp32', 'fp16', 'bf16']
+
+
+def resolve_precision(precision: str, device: torch.device) -> torch.dtype | None:
+    # reduced precision dtype for the device, None meaning fp32
+    assert precision in PRECISIONS, f'unknown precision {precision}, expected one of {PRECISIONS}'
+
+    if precision == 'auto':
+        return torch.float16 if device.type == 'cuda' else None
+
+    if precision == 'fp16':
+        if device.type in ('cuda', 'mps'):
+            return torch.float16
+        logging.getLogger().warning(f'fp16 is not supported on {device.type}, using fp32 (bf16 is the CPU option)')
+
+    if precision == 'bf16':
+        if device.type == 'cpu' or (device.type == 'cuda' and torch.cuda.is_bf16_supported()):
+            return torch.bfloat16
+        logging.getLogger().warning(f'bf16 is not supported on {device.type}, using fp32')
+
+    return None
+
+
+def get_precision_name(dtype: torch.dtype | None) -> str:
+    return {torch.float16: 'fp16', torch.bfloat16: 'bf16'}.get(dtype, 'fp32')
+
+
+def build_reference_label_map(config: SpadeConfig, seed: int = 0) -> npt.NDArray[np.uint8]:
+    # large uniform regions like the composed masks have, rather than per pixel noise
+    width, height = config.content_resolution
+    rng = np.random.default_rng(seed)
+
+    regions = rng.integers(0, config.label_nc + 1, (8, round(8 * width / height)), dtype=np.uint8)
+    return cv2.resize(regions, (width, height), interpolation=cv2.INTER_NEAREST)
+
+
+def compute_psnr(reference: npt.NDArray[np.uint8], image: npt.NDArray[np.uint8]) -> float:
+    mse = np.mean((reference.astype(np.float64) - image.astype(np.float64)) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
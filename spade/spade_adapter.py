@@ -1,4 +1,8 @@
 import logging
+import platform
+import threading
+from concurrent.futures import CancelledError, Future
+from pathlib import Path
 
 import cv2
 import torch
@@ -8,26 +12,216 @@ import numpy as np
 import numpy.typing as npt
 
 from config.modules_configs.spade_config import SpadeConfig
+from image_upscaler.classical_upscaler import ClassicalUpscaler
+from image_upscaler.compact_upscaler import CompactUpscaler
 from image_upscaler.image_upscaler import ImageUpscaler
+from image_upscaler.onnx_upscaler import OnnxUpscaler
+from image_upscaler.tiered_upscaler import TieredUpscaler, UPSCALER_TIERS
+from image_upscaler.tiling import get_tile_candidates, load_tiling, save_tiling, tune_tiling
+from spade.batched_inference import BatchedInferenceEngine, LIVE_PRIORITY, SPECULATIVE_PRIORITY
+from spade.frame_cache import FrameCache
+from spade.frame_pipeline import FramePipeline
+from spade.onnx_backend import OnnxPix2PixModel, get_upscaler_onnx_path
 from spade.pix2pix_model import Pix2PixModel
+from spade.precision import build_reference_label_map, compute_psnr, get_precision_name, resolve_precision
 
 
 class SpadeAdapter:
-    def __init__(self, config: SpadeConfig):
+    def __init__(self, config: SpadeConfig, frame_budget: float | None = None):
         self.config = config
         self.logger = logging.getLogger()
 
-        self.device = self._setup_device(config.device_type)
-        self.logger.info(f"Spade using device: {self.device}")
+        # precision of each stage after the PSNR guard, None meaning fp32
+        self.stage_precisions: dict[str, torch.dtype | None] = {}
 
-        self.upscaler = ImageUpscaler(weights_path=config.upscaler_model, scale=config.upscale_scale)
+        self.use_onnx_runtime = config.device_type == 'onnx'
+        self.device = self._setup_device('cpu' if self.use_onnx_runtime else config.device_type)
+        self.logger.info(f"Spade using device: {'onnx runtime' if self.use_onnx_runtime else self.device}")
 
-        if not config.bypass_spade:
+        if self.use_onnx_runtime:
+            self.upscaler = OnnxUpscaler(get_upscaler_onnx_path(config), config.upscale_scale, config.onnx_threads,
+                                         saturation_factor=config.saturation_factor)
+        else:
+            # precision is set once the generator is available for the quality check
+            self.upscaler = ImageUpscaler(weights_path=config.upscaler_model, scale=config.upscale_scale, precision='fp32',
+                                          saturation_factor=config.saturation_factor)
+
+        if config.bypass_spade:
+            self.model = None
+        elif self.use_onnx_runtime:
+            self.model = OnnxPix2PixModel(config)
+        else:
             self.model = Pix2PixModel(config, self.device)
             self.model.eval()
             self.model.to(self.device)
+            if config.fuse_model_for_inference:
+                self.model.fuse_for_inference(config.fusion_verification_tolerance)
+
+        self.inference_engine = None
+        if self.model is not None:
+            self.inference_engine = BatchedInferenceEngine(
+                self.model, self.device, config.inference_max_batch_size, config.inference_max_wait,
+                config.content_resolution
+            )
+
+        if self.use_onnx_runtime:
+            if config.precision not in ('auto', 'fp32') or config.channels_last:
+                self.logger.warning('ONNX runtime models run in fp32, precision and channels_last are not used')
         else:
-            self.model = None
+            self._setup_precision()
+            if self.model is not None:
+                self.model.compile_generator(config.compile_mode)
+
+        if self.model is not None and config.warm_up_iterations > 0:
+            self.model.warm_up(config.warm_up_iterations)
+
+        self._setup_upscaler_tiling()
+        self.upscaler_tiers = self._build_upscaler_tiers(frame_budget)
+
+        # frames being generated, so concurrent requests of the same label map wait instead of generating twice
+        self._pending_frames: dict[str, Future] = {}
+        self._pending_frames_lock = threading.Lock()
+
+        self.frame_cache = None
+        if config.use_frame_cache and not config.bypass_spade:
+            self.frame_cache = FrameCache(
+                config.frame_cache_max_bytes,
+                self.get_frame_cache_salt(),
+                config.frame_cache_disk_path if config.use_frame_cache_disk else None,
+                config.frame_cache_disk_format
+            )
+
+        # live frames are generated while the previous ones are upscaled
+        self.frame_pipeline = None
+        if config.use_frame_pipeline and self.model is not None:
+            self.frame_pipeline = FramePipeline(
+                [('generation', self._generation_stage), ('upscale', self._upscale_stage)],
+                config.frame_pipeline_queue_size
+            )
+
+    def get_frame_cache_salt(self) -> str:
+        # every setting that changes the generated pixels for the same label map, with the precisions in effect after
+        # the PSNR guard rather than the configured one; the device is left out, so frames pre-rendered on another
+        # machine stay valid when it runs the stages in the same precisions
+        config = self.config
+        generator_precision = get_precision_name(self.stage_precisions.get('generator'))
+        upscaler_precision = get_precision_name(self.stage_precisions.get('upscaler'))
+
+        settings = [
+            config.model_name, config.weights_path, config.label_index_input, config.fuse_model_for_inference,
+            config.compile_mode, generator_precision, config.channels_last, config.tile_size, config.tile_overlap,
+            config.upscaler_model, config.upscale_scale, upscaler_precision, config.saturation_factor
+        ]
+        return '|'.join(str(setting) for setting in settings)
+
+    def _setup_precision(self):
+        label_map = build_reference_label_map(self.config)
+
+        if self.model is not None:
+            self._set_stage_precision(
+                'generator', self.model.set_precision, resolve_precision(self.config.precision, self.device),
+                lambda: self.inference_engine.generate([label_map])[0]
+            )
+
+        self._set_upscaler_precision('upscaler', self.upscaler)
+
+    def _set_upscaler_precision(self, name, upscaler):
+        # upscalers pick their own device, which may differ from the generator one
+        dtype = resolve_precision(self.config.precision, upscaler.device)
+        frame = None
+        if self.model is not None and dtype is not None:
+            frame = self.inference_engine.generate([build_reference_label_map(self.config)])[0]
+
+        self._set_stage_precision(
+            name, upscaler.set_precision, dtype, (lambda: upscaler.upscale(frame)) if frame is not None else None
+        )
+
+    def _setup_upscaler_tiling(self):
+        config = self.config
+
+        if not config.upscaler_tile_auto_tune or self.model is None:
+            self.upscaler.set_tiling(config.upscaler_tile, config.upscaler_tile_workers)
+            self.logger.info(f'Upscaler tiling: tile {config.upscaler_tile}, {config.upscaler_tile_workers} workers')
+            return
+
+        device_type = 'cpu' if self.use_onnx_runtime else self.upscaler.device.type
+        key = self.get_upscaler_tiling_key(device_type)
+        tiling = load_tiling(config.upscaler_tiling_path, key)
+
+        if tiling is None:
+            width, height = config.content_resolution
+            image = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+            tile_candidates = get_tile_candidates(device_type, config.upscaler_tile)
+            tile, workers_count, frame_time = tune_tiling(self.upscaler, image, device_type, tile_candidates)
+            tiling = {'tile': tile, 'workers': workers_count, 'frame_time': frame_time}
+            save_tiling(config.upscaler_tiling_path, key, tiling)
+
+        self.upscaler.set_tiling(tiling['tile'], tiling['workers'])
+        self.logger.info(f"Upscaler tiling: tile {tiling['tile']}, {tiling['workers']} workers, "
+                         f"{tiling['frame_time'] * 1000:.1f} ms per frame ({key})")
+
+    def _build_upscaler_tiers(self, frame_budget: float | None) -> TieredUpscaler:
+        config = self.config
+        tiers = []
+
+        for name in config.upscaler_tiers:
+            assert name in UPSCALER_TIERS, f'unknown upscaler tier {name}, expected one of {UPSCALER_TIERS}'
+
+            if name == 'realesrgan':
+                tiers.append((name, self.upscaler))
+            elif name == 'compact':
+                if not Path(config.compact_upscaler_model).exists():
+                    self.logger.warning(f'{config.compact_upscaler_model} not found, compact upscaler tier is not used')
+                    continue
+
+                upscaler = CompactUpscaler(config.compact_upscaler_model, config.upscale_scale, config.compact_upscaler_scale,
+                                           'fp32', config.channels_last, config.saturation_factor)
+                upscaler.set_tiling(0)
+                self._set_upscaler_precision('compact upscaler', upscaler)
+                tiers.append((name, upscaler))
+            else:
+                tiers.append((name, ClassicalUpscaler(config.upscale_scale, saturation_factor=config.saturation_factor)))
+
+        if not tiers:
+            tiers.append(('realesrgan', self.upscaler))
+
+        return TieredUpscaler(tiers, frame_budget if not config.bypass_spade else None,
+                              pipelined=config.use_frame_pipeline)
+
+    def get_upscaler_tiling_key(self, device_type: str) -> str:
+        config = self.config
+
+        if device_type == 'cuda':
+            device_name = torch.cuda.get_device_name(self.upscaler.device)
+        else:
+            device_name = f'{platform.processor() or platform.machine()} x{torch.get_num_threads()}'
+
+        runtime = f'onnx x{config.onnx_threads}' if self.use_onnx_runtime else config.precision
+        width, height = config.content_resolution
+
+        return f'{device_type} {device_name}|{config.upscaler_model}|x{config.upscale_scale}|{runtime}|{width}x{height}'
+
+    def _set_stage_precision(self, name, set_precision, dtype, render):
+        channels_last = self.config.channels_last
+        min_psnr = self.config.precision_min_psnr
+
+        self.stage_precisions[name] = dtype
+
+        if dtype is None or min_psnr is None or render is None:
+            set_precision(dtype, channels_last)
+            return
+
+        reference = render()
+        set_precision(dtype, channels_last)
+        psnr = compute_psnr(reference, render())
+
+        if psnr < min_psnr:
+            self.logger.warning(f'{name} {dtype} PSNR against fp32 {psnr:.1f} dB is below {min_psnr:.1f} dB, using fp32')
+            set_precision(None, channels_last)
+            self.stage_precisions[name] = None
+        else:
+            self.logger.info(f'{name} running in {dtype}, PSNR against fp32 {psnr:.1f} dB')
 
     @staticmethod
     def _setup_device(device_type: str) -> torch.device:
@@ -49,41 +243,158 @@ class SpadeAdapter:
             normalized_mask = cv2.normalize(mask, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
             return cv2.applyColorMap(normalized_mask, self.config.colormap)
 
-        inf_start = time.time()
-        data = {
-            'label': torch.from_numpy(np.stack([mask])).unsqueeze(1).float(),
-            'instance': torch.zeros(1).to(self.device),
-            'image': torch.zeros(1, 3, mask.shape[0], mask.shape[1]).to(self.device)
-        }
-
-        with torch.no_grad():
-            if self.device.type == 'cuda':
-                with torch.cuda.amp.autocast():
-                    generated = self.model(data, mode='inference')
-            else:
-                generated = self.model(data, mode='inference')
+        if self.frame_cache is None:
+            return self._generate_image(mask, start_time)[0]
+
+        frame_key = self.frame_cache.build_key(mask)
+        image = self.frame_cache.get(frame_key)
+
+        if image is not None:
+            logging.info(f"frame cache hit, took {time.time() - start_time:.4f} seconds.")
+            return image
+
+        pending_frame, generating = self._claim_frame(frame_key)
+
+        if not generating:
+            try:
+                return pending_frame.result()
+            except CancelledError:
+                # dropped by the frame pipeline in favour of a newer frame
+                return self.process_mask(mask)
+
+        try:
+            image, full_quality = self._generate_image(mask, start_time)
+            # frames of the cheaper upscaler tiers would outlive the overload, they are not kept
+            if full_quality:
+                self.frame_cache.put(frame_key, image)
+            pending_frame.set_result(image)
+        except Exception as error:
+            pending_frame.set_exception(error)
+            raise
+
+        return image
+
+    def submit_frame(self, mask: npt.NDArray[np.uint8]) -> Future:
+        # frame of the live pipeline, cancelled when dropped for newer frames while waiting for one of the stages
+        if self.frame_pipeline is None:
+            frame = Future()
+            frame.set_result(self.process_mask(mask))
+            return frame
+
+        start_time = time.time()
+
+        if self.frame_cache is None:
+            return self.frame_pipeline.submit((mask, None, start_time))
+
+        frame_key = self.frame_cache.build_key(mask)
+        image = self.frame_cache.get(frame_key)
+
+        if image is not None:
+            logging.info(f"frame cache hit, took {time.time() - start_time:.4f} seconds.")
+            frame = Future()
+            frame.set_result(image)
+            return frame
+
+        pending_frame, generating = self._claim_frame(frame_key)
+        if generating:
+            self.frame_pipeline.submit((mask, frame_key, start_time), pending_frame)
+
+        return pending_frame
+
+    def is_frame_known(self, frame_key: str) -> bool:
+        with self._pending_frames_lock:
+            if frame_key in self._pending_frames:
+                return True
+
+        return self.frame_cache.contains(frame_key)
 
-        inf_end = time.time()
-        logging.info(f"inference took {inf_end - inf_start:.4f} seconds.")
-        
-        image = ((generated[0].cpu().numpy() * 0.5 + 0.5) * 255).clip(0, 255).astype(np.uint8)
-        if image.shape[0] == 3:
-            image = image[[2, 1, 0]].transpose(1, 2, 0)
+    def store_speculative_frame(self, frame_key: str, image: npt.NDArray[np.uint8], generation_time: float) -> bool:
+        # speculative frames are generated through submit_mask and upscaled here, unless a live request got there first
+        if self.frame_cache.contains(frame_key):
+            return False
 
-        del generated, data
-        if self.device.type == 'cuda':
-            torch.cuda.empty_cache()
-        elif self.device.type == 'mps':
-            torch.mps.empty_cache()
+        pending_frame, generating = self._claim_frame(frame_key)
+        if not generating:
+            return False
 
+        try:
+            image, full_quality = self._upscale_image(image, generation_time, time.time() - generation_time)
+            if full_quality:
+                self.frame_cache.put(frame_key, image)
+            pending_frame.set_result(image)
+        except Exception as error:
+            pending_frame.set_exception(error)
+            raise
+
+        return full_quality
+
+    def _claim_frame(self, frame_key: str) -> tuple[Future, bool]:
+        with self._pending_frames_lock:
+            pending_frame = self._pending_frames.get(frame_key)
+            if pending_frame is not None and not pending_frame.cancelled():
+                return pending_frame, False
+
+            pending_frame = self._pending_frames[frame_key] = Future()
+
+        pending_frame.add_done_callback(lambda _: self._release_frame(frame_key, pending_frame))
+        return pending_frame, True
+
+    def _release_frame(self, frame_key: str, pending_frame: Future):
+        with self._pending_frames_lock:
+            if self._pending_frames.get(frame_key) is pending_frame:
+                del self._pending_frames[frame_key]
+
+    def _generate_image(self, mask: npt.NDArray[np.uint8], start_time: float) -> tuple[npt.NDArray[np.uint8], bool]:
+        image = self.inference_engine.submit(mask).result()
+        return self._upscale_image(image, time.time() - start_time, start_time)
+
+    def _upscale_image(self, image: npt.NDArray[np.uint8], generation_time: float,
+                       start_time: float) -> tuple[npt.NDArray[np.uint8], bool]:
         up_start = time.time()
-        image = self.upscaler.upscale(image)
+        image, tier_index = self.upscaler_tiers.upscale(image, generation_time)
         up_end = time.time()
-        logging.info(f"upscale took {up_end - up_start:.4f} seconds.")
-        
+        logging.info(f"upscale ({self.upscaler_tiers.tiers[tier_index][0]}) took {up_end - up_start:.4f} seconds.")
+
         logging.info(f"Total took {time.time() - start_time:.4f} seconds.")
+        return image, tier_index == 0
+
+    def _generation_stage(self, frame: tuple) -> tuple:
+        mask, frame_key, start_time = frame
+
+        generation_start = time.time()
+        image = self.inference_engine.submit(mask).result()
+
+        return image, frame_key, start_time, time.time() - generation_start
+
+    def _upscale_stage(self, frame: tuple) -> npt.NDArray[np.uint8]:
+        image, frame_key, start_time, generation_time = frame
+
+        image, full_quality = self._upscale_image(image, generation_time, start_time)
+        if full_quality and frame_key is not None:
+            self.frame_cache.put(frame_key, image)
+
         return image
 
+    def get_frame_cache_stats(self) -> dict | None:
+        return self.frame_cache.stats if self.frame_cache is not None else None
+
+    def get_frame_pipeline_stats(self) -> dict | None:
+        return self.frame_pipeline.stats if self.frame_pipeline is not None else None
+
+    def submit_mask(self, mask: npt.NDArray[np.uint8], speculative: bool = False) -> Future:
+        # generated, not upscaled frame; speculative masks wait for live ones and fill their batches
+        return self.inference_engine.submit(mask, SPECULATIVE_PRIORITY if speculative else LIVE_PRIORITY)
+
+    def cleanup(self):
+        if self.frame_pipeline is not None:
+            self.frame_pipeline.shutdown()
+
+        if self.inference_engine is not None:
+            self.inference_engine.shutdown()
+
+        if self.frame_cache is not None:
+            self.frame_cache.shutdown()
+
     def get_empty_frame(self):
         width, height = self.config.output_resolution
         return np.zeros((height, width, 3), dtype=np.uint8)
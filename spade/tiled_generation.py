@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import torch
+
+
+def build_tile_starts(length: int, tile_length: int, overlap: int) -> list[int]:
+    assert tile_length <= length, f'tile of {tile_length} does not fit in {length}'
+    if tile_length == length:
+        return [0]
+
+    assert 0 <= overlap < tile_length, f'overlap {overlap} has to be smaller than the tile {tile_length}'
+
+    starts = list(range(0, length - tile_length, tile_length - overlap))
+    # the last tile is aligned to the end, overlapping its neighbour more than the others
+    starts.append(length - tile_length)
+
+    return starts
+
+
+def build_blend_ramp(tile_length: int, overlap_before: int, overlap_after: int, device) -> torch.Tensor:
+    # linear cross-fade over the overlaps with the neighbouring tiles, flat where the tile is alone
+    ramp = torch.ones(tile_length, device=device)
+
+    if overlap_before > 0:
+        ramp[:overlap_before] = (torch.arange(overlap_before, device=device) + 0.5) / overlap_before
+    if overlap_after > 0:
+        ramp[tile_length - overlap_after:] = torch.minimum(
+            ramp[tile_length - overlap_after:],
+            (torch.arange(overlap_after, 0, -1, device=device) - 0.5) / overlap_after
+        )
+
+    return ramp
+
+
+def build_blend_ramps(starts: list[int], tile_length: int, device) -> list[torch.Tensor]:
+    ramps = []
+
+    for index, start in enumerate(starts):
+        overlap_before = starts[index - 1] + tile_length - start if index > 0 else 0
+        overlap_after = start + tile_length - starts[index + 1] if index < len(starts) - 1 else 0
+        ramps.append(build_blend_ramp(tile_length, overlap_before, overlap_after, device))
+
+    return ramps
+
+
+class TiledGenerator:
+    def __init__(self, generate_tile: Callable[[torch.Tensor], torch.Tensor], tile_size: tuple[int, int],
+                 overlap: int, workers_count: int = 1):
+        self._generate_tile = generate_tile
+        self._tile_width, self._tile_height = tile_size
+        self._overlap = overlap
+
+        self._executor = ThreadPoolExecutor(workers_count, thread_name_prefix='spade_tile') if workers_count > 1 else None
+
+    def __call__(self, label_map: torch.Tensor) -> torch.Tensor:
+        height, width = label_map.size()[2:]
+
+        starts_y = build_tile_starts(height, self._tile_height, self._overlap)
+        starts_x = build_tile_starts(width, self._tile_width, self._overlap)
+        tiles = [(start_y, start_x) for start_y in starts_y for start_x in starts_x]
+
+        label_tiles = [
+            label_map[:, :, start_y:start_y + self._tile_height, start_x:start_x + self._tile_width]
+            for start_y, start_x in tiles
+        ]
+
+        if self._executor is not None:
+            generated_tiles = list(self._executor.map(self._generate_tile, label_tiles))
+        else:
+            generated_tiles = [self._generate_tile(label_tile) for label_tile in label_tiles]
+
+        # tiles may come out at a multiple of the label resolution
+        scale = generated_tiles[0].size(-1) // self._tile_width
+        tile_height, tile_width = self._tile_height * scale, self._tile_width * scale
+
+        device = generated_tiles[0].device
+        ramps_y = dict(zip(starts_y, build_blend_ramps([start * scale for start in starts_y], tile_height, device)))
+        ramps_x = dict(zip(starts_x, build_blend_ramps([start * scale for start in starts_x], tile_width, device)))
+
+        batch_size, channels = generated_tiles[0].size()[:2]
+        blended = torch.zeros(batch_size, channels, height * scale, width * scale, device=device)
+        weights = torch.zeros(1, 1, height * scale, width * scale, device=device)
+
+        for (start_y, start_x), generated_tile in zip(tiles, generated_tiles):
+            tile_weights = ramps_y[start_y][:, None] * ramps_x[start_x][None, :]
+            region = (slice(None), slice(None),
+                      slice(start_y * scale, start_y * scale + tile_height),
+                      slice(start_x * scale, start_x * scale + tile_width))
+
+            blended[region] += generated_tile.float() * tile_weights
+            weights[region] += tile_weights
+
+        return blended / weights
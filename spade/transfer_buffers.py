@@ -0,0 +1,89 @@
+import numpy as np
+import numpy.typing as npt
+import torch
+
+
+class TransferSlot:
+    def __init__(self, device: torch.device, max_batch_size: int, height: int, width: int, channels: int):
+        use_cuda = device.type == 'cuda'
+
+        self.host_labels = torch.zeros(max_batch_size, 1, height, width, dtype=torch.uint8, pin_memory=use_cuda)
+        self.labels = torch.zeros_like(self.host_labels, device=device) if device.type != 'cpu' else self.host_labels
+        self.host_images = torch.zeros(max_batch_size, channels, height, width, dtype=torch.uint8, pin_memory=use_cuda)
+
+        self.uploaded = torch.cuda.Event() if use_cuda else None
+        self.downloaded = torch.cuda.Event() if use_cuda else None
+
+        self.count = 0
+        self.launch_time = 0.0
+
+    def download(self, generated: torch.Tensor):
+        # quantized on the device, so a quarter of the float output crosses the bus
+        images = ((generated.float() * 0.5 + 0.5) * 255).clamp_(0, 255).to(torch.uint8)
+
+        # the generator renders at its configured size whatever the masks size, the output buffer follows it
+        if self.host_images.shape[1:] != images.shape[1:]:
+            self.host_images = torch.zeros(self.host_images.size(0), *images.shape[1:], dtype=torch.uint8,
+                                           pin_memory=self.host_images.is_pinned())
+
+        self.host_images[:self.count].copy_(images, non_blocking=self.downloaded is not None)
+        if self.downloaded is not None:
+            self.downloaded.record()
+
+    def collect(self) -> list[npt.NDArray[np.uint8]]:
+        if self.downloaded is not None:
+            self.downloaded.synchronize()
+
+        return [
+            image[[2, 1, 0]].transpose(1, 2, 0) if image.shape[0] == 3 else image.copy()
+            for image in self.host_images[:self.count].numpy()
+        ]
+
+
+class TransferBuffers:
+    # host and device tensors of one resolution, allocated once and reused by every batch;
+    # two slots so the next batch is uploaded on the copy stream while the previous one is computed
+    SLOTS_COUNT = 2
+
+    def __init__(self, device: torch.device, max_batch_size: int, resolution: tuple[int, int], channels: int = 3):
+        width, height = resolution
+
+        self._device = device
+        self._slots = [TransferSlot(device, max_batch_size, height, width, channels) for _ in range(self.SLOTS_COUNT)]
+        self._slot_index = 0
+        self._copy_stream = torch.cuda.Stream(device) if device.type == 'cuda' else None
+
+        self.instance = torch.zeros(1, device=device)
+        self.image = torch.zeros(max_batch_size, 3, height, width, device=device)
+
+    def upload(self, masks: list[npt.NDArray[np.uint8]]) -> TransferSlot:
+        slot = self._slots[self._slot_index]
+        self._slot_index = (self._slot_index + 1) % len(self._slots)
+
+        # the slot was used two batches ago, its results must be read out before it is overwritten
+        if slot.downloaded is not None:
+            slot.downloaded.synchronize()
+
+        slot.count = len(masks)
+        host_labels = slot.host_labels[:slot.count, 0].numpy()
+        for index, mask in enumerate(masks):
+            host_labels[index] = mask
+
+        if self._copy_stream is not None:
+            with torch.cuda.stream(self._copy_stream):
+                slot.labels[:slot.count].copy_(slot.host_labels[:slot.count], non_blocking=True)
+                slot.uploaded.record()
+        elif slot.labels is not slot.host_labels:
+            slot.labels[:slot.count].copy_(slot.host_labels[:slot.count])
+
+        return slot
+
+    def build_data(self, slot: TransferSlot) -> dict:
+        if slot.uploaded is not None:
+            torch.cuda.current_stream(self._device).wait_event(slot.uploaded)
+
+        return {
+            'label': slot.labels[:slot.count],
+            'instance': self.instance,
+            'image': self.image[:slot.count]
+        }
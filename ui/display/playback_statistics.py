@@ -6,6 +6,9 @@ class PlaybackStatistics:
         self.playback_time = 0.0
         self.displayed_frames = 0
         self.playing = False
+        self.frame_cache_stats = None
+        self.frame_pipeline_stats = None
+        self.speculative_stats = None
 
     def format_stats(self):
         if self.start_time == 0:
@@ -17,11 +20,34 @@ class PlaybackStatistics:
 
         display_fps = self.displayed_frames / max(elapsed, 0.001)
 
-        return (
+        stats = (
             f"{int(hours):02}:{int(minutes):02}:{seconds:05.2f} | "
             f"Total frames: {self.displayed_frames} ({display_fps:.1f}/s)"
         )
 
+        if self.frame_cache_stats is not None:
+            cache_stats = self.frame_cache_stats
+            stats += (
+                f" | Frame cache: {cache_stats['memory_hits']}+{cache_stats['disk_hits']} hits, "
+                f"{cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%}), "
+                f"{cache_stats['size_bytes'] / 1e6:.0f} MB"
+            )
+
+        if self.frame_pipeline_stats is not None:
+            stats += " | " + ", ".join(
+                f"{name}: {stage_stats['depth']} queued, {stage_stats['dropped']} dropped, "
+                f"{stage_stats['wait_time'] * 1000:.0f}+{stage_stats['process_time'] * 1000:.0f} ms"
+                for name, stage_stats in self.frame_pipeline_stats.items()
+            )
+
+        if self.speculative_stats is not None:
+            stats += (
+                f" | Speculative: {self.speculative_stats['rendered']} rendered, "
+                f"{self.speculative_stats['skipped']} skipped"
+            )
+
+        return stats
+
     def update_display_frame(self):
         self.displayed_frames += 1
        
@@ -26,8 +26,13 @@ class SequencesTree(Tree):
         if sequence_state == SequenceStatus.LOADING:
             sequence_node.label = f"{sequence_name} (loading)"
             sequence_node.allow_expand = False
+        elif sequence_state == SequenceStatus.UNLOADED:
+            sequence_node.label = f"{sequence_name} (unloaded)"
+            sequence_node.remove_children()
+            sequence_node.allow_expand = False
         elif sequence_state == SequenceStatus.READY:
             sequence_node.label = sequence_name
+            sequence_node.remove_children()
             sequence_node.allow_expand = True
 
             static_masks_node = sequence_node.add('static_masks', data=sequence_info['sequence_config']['static_masks'])
@@ -165,6 +165,16 @@ class ExpoApp(App):
         self.final_counter_display.numbers = [values[base_values_count]]  # Global
         self.aggregate_counters_display.numbers = values[base_values_count+1:].tolist()  # Left, Center, Right
 
+    def update_frame_cache_stats(self, stats):
+        # picked up by the playback statistics refresh loop
+        self._window_display.stats.frame_cache_stats = stats
+
+    def update_frame_pipeline_stats(self, stats):
+        self._window_display.stats.frame_pipeline_stats = stats
+
+    def update_speculative_stats(self, stats):
+        self._window_display.stats.speculative_stats = stats
+
     def update_epoch(self, epoch):
         self.call_from_thread(self._update_epoch, epoch)
 